@@ -1,52 +1,225 @@
+import functools
+import os
+import re
+
 import duckdb
 import pandas as pd
 import streamlit as st
 
 DB_PATH = "warehouse.duckdb"
+# Sidecar written by pipelines/update_warehouse.py with the current load generation id
+GENERATION_SUFFIX = ".generation"
+
+# Query results are cached per warehouse generation; the warehouse only
+# changes after the daily refresh, so the TTL is just a safety net.
+CACHE_TTL_SECONDS = 3600
+CACHE_MAX_ENTRIES = 256
+
+# Rows per screen on the ledger page
+LEDGER_PAGE_SIZE = 100
+
+# Whitespace runs outside single-quoted literals
+_SQL_WHITESPACE = re.compile(r"('(?:[^']|'')*')|\s+")
 
-@st.cache_resource
 def get_connection():
     """
-    Returns a read-only connection to the DuckDB warehouse.
-    Uses cache_resource to ensure we don't reopen connections unnecessarily.
+    Opens a read-only connection to the DuckDB warehouse; close it when done
+    (use it as a context manager).
+    It is deliberately not cached: an open handle, even read-only, holds the
+    file lock, so a long-lived one would block update_warehouse.py / dbt and
+    keep reading the old file after a refresh. Results are cached per
+    warehouse generation (see get_data), so a connection is only opened on
+    a cache miss.
+    """
+    return duckdb.connect(DB_PATH, read_only=True)
+
+def load_generation_id() -> str | None:
+    """
+    Returns the generation id published by pipelines/update_warehouse.py, if any.
+    """
+    try:
+        with open(DB_PATH + GENERATION_SUFFIX, encoding="utf-8") as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+def warehouse_generation() -> str | None:
+    """
+    Returns a stamp that changes whenever the warehouse changes: the load
+    generation id plus the file's mtime/size (dbt rewrites the file without
+    a new load). Used as part of every cache key so a refresh invalidates
+    cached results.
     """
-    # read_only=True is important for concurrent access if multiple users were accessing,
-    # though DuckDB file locking can be tricky.
-    # For this demo app, we'll try read_only=True to avoid locking the file against dbt.
-    conn = duckdb.connect(DB_PATH, read_only=True)
-    return conn
+    try:
+        stat = os.stat(DB_PATH)
+    except OSError:
+        return None
+    return f"{load_generation_id() or '-'}:{stat.st_mtime_ns}-{stat.st_size}"
 
-def get_data(query: str) -> pd.DataFrame:
+def normalize_sql(query: str) -> str:
+    """
+    Collapses insignificant whitespace so formatting differences share a cache entry.
+    """
+    return _SQL_WHITESPACE.sub(lambda m: m.group(1) or " ", query).strip()
+
+@st.cache_data(ttl=CACHE_TTL_SECONDS, max_entries=CACHE_MAX_ENTRIES, show_spinner=False)
+def _cached_query(query: str, params: tuple, generation: str | None) -> pd.DataFrame:
+    # generation is only part of the cache key.
+    # Each miss opens and closes its own connection, so the warehouse lock
+    # is released as soon as the result is read and the next miss after a
+    # refresh sees the new file.
+    with get_connection() as conn:
+        return conn.execute(query, list(params)).df()
+
+def get_data(query: str, params: list | tuple | None = None) -> pd.DataFrame:
     """
     Executes a SQL query and returns the result as a Pandas DataFrame.
+    Results are cached on (normalized SQL, params, warehouse generation).
     """
-    conn = get_connection()
-    return conn.sql(query).df()
+    return _cached_query(normalize_sql(query), tuple(params or ()), warehouse_generation())
 
 def get_kpis():
     """
     Get key metrics for the dashboard.
+    Summed from the dbt rollups (gold_rollup_orders_daily for totals,
+    gold_rollup_billing_status for unbilled/overdue), so the cost is the
+    number of groups rather than orders; get_data() caches it per
+    warehouse generation.
     """
-    # Assuming gold_ledger is in main_gold schema or similar
-    # Adjust schema based on dbt output.
-    # We verified table is 'gold_ledger' in 'main_gold' schema.
-    df = get_data("SELECT * FROM main_gold.gold_ledger")
-    
-    total_orders = len(df)
-    total_amount = df['amount'].sum()
-    
-    # Simple statuses
-    unbilled = df[df['billing_status'] == 'UNBILLED']['amount'].sum()
-    
-    # Mocking 'Overdue' logic if not strictly in column yet or using billing_status
-    # For now, let's assume if there's an 'OVERDUE' status
-    overdue = 0
-    if 'billing_status' in df.columns:
-         overdue = df[df['billing_status'] == 'OVERDUE']['amount'].sum()
+    row = get_data("""
+        SELECT
+            COALESCE((SELECT SUM(order_count) FROM main_gold.gold_rollup_orders_daily), 0) AS total_orders,
+            COALESCE((SELECT SUM(total_amount) FROM main_gold.gold_rollup_orders_daily), 0) AS total_amount,
+            COALESCE(SUM(total_amount) FILTER (WHERE billing_status = 'UNBILLED'), 0) AS unbilled,
+            COALESCE(SUM(total_amount) FILTER (WHERE billing_status = 'OVERDUE'), 0) AS overdue
+        FROM main_gold.gold_rollup_billing_status
+    """).iloc[0]
 
     return {
-        "total_orders": total_orders,
-        "total_amount": total_amount,
-        "unbilled": unbilled,
-        "overdue": overdue
+        "total_orders": int(row["total_orders"]),
+        "total_amount": float(row["total_amount"]),
+        "unbilled": float(row["unbilled"]),
+        "overdue": float(row["overdue"])
     }
+
+def count_action_required() -> int:
+    """
+    Number of orders that are UNBILLED or OVERDUE, from the billing rollup.
+    """
+    df = get_data("""
+        SELECT COALESCE(SUM(order_count), 0) AS total
+        FROM main_gold.gold_rollup_billing_status
+        WHERE billing_status IN ('UNBILLED', 'OVERDUE')
+    """)
+    return int(df["total"].iloc[0])
+
+def get_top_exceptions(limit: int = 5) -> pd.DataFrame:
+    """
+    Most urgent exceptions first: by severity (as getTopExceptions() in
+    web/src/lib/data.ts), then days overdue and amount.
+    """
+    return get_data("""
+        SELECT *
+        FROM main_gold.gold_exceptions
+        ORDER BY CASE severity WHEN 'CRITICAL' THEN 0 WHEN 'HIGH' THEN 1 WHEN 'MEDIUM' THEN 2 ELSE 3 END,
+            days_overdue DESC NULLS LAST, amount DESC, order_id, exception_type
+        LIMIT ?
+    """, [limit])
+
+@functools.lru_cache(maxsize=64)
+def _ledger_sql(n_statuses: int, has_from: bool, has_to: bool, has_keyword: bool,
+                cursor: str | None, count: bool) -> str:
+    """
+    Renders the ledger SQL for one filter shape. Only the shape (which
+    filters are set, how many statuses) goes into the text; every value is
+    a ? placeholder, so a given combination always yields the same statement.
+    """
+    clauses = []
+    if n_statuses:
+        clauses.append(f"billing_status IN ({', '.join('?' * n_statuses)})")
+    if has_from:
+        clauses.append("order_date >= ?")
+    if has_to:
+        clauses.append("order_date <= ?")
+    if has_keyword:
+        clauses.append("(organization_name ILIKE ? OR procurement_name ILIKE ?)")
+    if cursor == "null":
+        clauses.append("order_date IS NULL AND sequence_no < ?")
+    elif cursor == "date":
+        clauses.append(
+            "(order_date < ? OR (order_date = ? AND sequence_no < ?) OR order_date IS NULL)"
+        )
+    where = " AND ".join(clauses) or "1=1"
+
+    if count:
+        return f"SELECT COUNT(*) AS total FROM main_gold.gold_ledger WHERE {where}"
+    return (
+        f"SELECT * FROM main_gold.gold_ledger WHERE {where} "
+        "ORDER BY order_date DESC NULLS LAST, sequence_no DESC LIMIT ?"
+    )
+
+def build_ledger_query(statuses: list[str] | None = None, date_from=None, date_to=None,
+                       keyword: str | None = None, after: tuple | None = None,
+                       page_size: int = LEDGER_PAGE_SIZE, count: bool = False) -> tuple[str, list]:
+    """
+    Translates ledger filters into a parameterized (sql, params) pair.
+    With count=True the statement returns the matching row count instead
+    of a page; `after` is a keyset cursor from ledger_page_key().
+    """
+    statuses = list(statuses or [])
+    params: list = list(statuses)
+    if date_from is not None:
+        params.append(date_from)
+    if date_to is not None:
+        params.append(date_to)
+    if keyword:
+        pattern = f"%{keyword}%"
+        params += [pattern, pattern]
+
+    cursor = None
+    if after is not None and not count:
+        after_date, after_seq = after
+        if after_date is None:
+            cursor = "null"
+            params.append(after_seq)
+        else:
+            cursor = "date"
+            params += [after_date, after_date, after_seq]
+
+    if not count:
+        params.append(page_size)
+
+    sql = _ledger_sql(len(statuses), date_from is not None, date_to is not None,
+                      bool(keyword), cursor, count)
+    return sql, params
+
+def count_ledger(**filters) -> int:
+    """
+    Total number of ledger rows matching the filters (see build_ledger_query).
+    Kept separate from the page query so it is computed once per filter
+    (and cached per warehouse generation) instead of on every page turn.
+    """
+    sql, params = build_ledger_query(count=True, **filters)
+    df = get_data(sql, params)
+    return int(df["total"].iloc[0])
+
+def get_ledger_page(after: tuple | None = None, page_size: int = LEDGER_PAGE_SIZE,
+                    **filters) -> pd.DataFrame:
+    """
+    Returns one page of the ledger, newest first, using keyset pagination on
+    (order_date, sequence_no). `after` is the key of the last row of the
+    previous page (see ledger_page_key), or None for the first page.
+    Orders without an order_date sort last.
+    """
+    sql, params = build_ledger_query(after=after, page_size=page_size, **filters)
+    return get_data(sql, params)
+
+def ledger_page_key(page: pd.DataFrame) -> tuple | None:
+    """
+    Keyset cursor for the page after `page`, or None if `page` is empty.
+    """
+    if page.empty:
+        return None
+    last = page.iloc[-1]
+    order_date = None if pd.isna(last["order_date"]) else last["order_date"]
+    return (order_date, last["sequence_no"])
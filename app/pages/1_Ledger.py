@@ -8,14 +8,42 @@ st.title("受注台帳 (Order Ledger)")
 # Sidebar Filters
 st.sidebar.header("Filter Options")
 status_filter = st.sidebar.multiselect("Billing Status", ["UNBILLED", "BILLED", "PAID", "OVERDUE", "INVALID"])
+date_range = st.sidebar.date_input("Order Date", value=())
+keyword = st.sidebar.text_input("Keyword (発注機関・件名)")
 
-# Query Construction
-query = "SELECT * FROM main_gold.gold_ledger WHERE 1=1"
-if status_filter:
-    status_list = "', '".join(status_filter)
-    query += f" AND billing_status IN ('{status_list}')"
+filters = {
+    "statuses": status_filter,
+    "date_from": date_range[0] if len(date_range) > 0 else None,
+    "date_to": date_range[1] if len(date_range) > 1 else None,
+    "keyword": keyword.strip() or None,
+}
 
-df = db_client.get_data(query)
+# Pagination state: a stack of keyset cursors, one per page visited.
+# Reset to the first page whenever the filters change.
+if st.session_state.get("ledger_filter") != filters:
+    st.session_state.ledger_filter = filters
+    st.session_state.ledger_cursors = [None]
+
+cursors = st.session_state.ledger_cursors
+page_size = db_client.LEDGER_PAGE_SIZE
+
+total = db_client.count_ledger(**filters)
+df = db_client.get_ledger_page(after=cursors[-1], page_size=page_size, **filters)
+
+page_no = len(cursors)
+total_pages = max(1, -(-total // page_size))
+has_next = len(df) == page_size and page_no < total_pages
+
+def go_prev():
+    cursors.pop()
+
+def go_next():
+    cursors.append(db_client.ledger_page_key(df))
+
+col_prev, col_info, col_next = st.columns([1, 4, 1])
+col_prev.button("← 前へ", on_click=go_prev, disabled=page_no == 1, use_container_width=True)
+col_info.markdown(f"**{page_no} / {total_pages} ページ** （全 {total:,} 件）")
+col_next.button("次へ →", on_click=go_next, disabled=not has_next, use_container_width=True)
 
 st.dataframe(
     df,
@@ -10,7 +10,9 @@ if st.button("レポートを生成する"):
     with st.spinner("Generating report..."):
         # Fetch data
         kpis = db_client.get_kpis()
-        exceptions = db_client.get_data("SELECT * FROM main_gold.gold_ledger WHERE billing_status = 'UNBILLED' OR billing_status = 'OVERDUE'")
+        # The count comes from the rollup; only the rows shown are fetched
+        action_count = db_client.count_action_required()
+        exceptions = db_client.get_top_exceptions(5)
         
         # Determine health
         health = "🟢 正常"
@@ -30,13 +32,13 @@ if st.button("レポートを生成する"):
 ### 1. サマリ
 - **未回収額**: ¥{kpis['unbilled'] + kpis['overdue']:,.0f} (内、期限超過: ¥{kpis['overdue']:,.0f})
 - **新規受注**: (今週分のロジックは未実装ですが、ここに表示予定)
-- **アクション**: {len(exceptions)} 件の対応が必要です。
+- **アクション**: {action_count} 件の対応が必要です。
 
 ### 2. 要対応リスト (Top 5)
 以下の案件について確認をお願いします。
 """
         st.markdown(report_md)
-        st.dataframe(exceptions.head(5)[['organization_name', 'procurement_name', 'amount', 'billing_status']])
+        st.dataframe(exceptions[['organization_name', 'procurement_name', 'amount', 'exception_type', 'severity', 'days_overdue']])
         
         st.info("このレポートをコピーしてSlack/Chatworkに貼り付けてください。")
 
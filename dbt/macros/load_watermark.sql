@@ -0,0 +1,9 @@
+{#
+    Highest load_generation already present in the incremental model being built.
+    pipelines/update_warehouse.py stamps every row it inserts or updates with the
+    run's generation id (see bronze._load_manifest), so rows above this watermark
+    are exactly the delta since the model's last run.
+#}
+{% macro load_watermark() -%}
+    (select coalesce(max(load_generation), '') from {{ this }})
+{%- endmacro %}
@@ -1,3 +1,13 @@
-select * 
-from {{ source('raw_data', 'bids') }}
-qualify row_number() over (partition by sequence_no order by snapshot_date desc) = 1
+-- bronze.bids is already deduplicated by sequence_no in pipelines/update_warehouse.py,
+-- so this is a plain projection; load_generation drives the incremental models.
+select
+    sequence_no,
+    procurement_name,
+    contract_date,
+    contract_amount,
+    organization_name,
+    contractor_name,
+    corporate_number,
+    snapshot_date,
+    load_generation
+from {{ source('warehouse', 'bids') }}
@@ -0,0 +1,10 @@
+-- bronze.document_chunks is merged by (doc_id, chunk_no) in pipelines/update_warehouse.py.
+select
+    doc_id,
+    page,
+    chunk_no,
+    char_start,
+    char_end,
+    text,
+    token_count
+from {{ source('warehouse', 'document_chunks') }}
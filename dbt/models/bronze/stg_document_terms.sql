@@ -0,0 +1,7 @@
+-- bronze.document_terms is merged by (term, chunk_id) in pipelines/update_warehouse.py.
+select
+    term,
+    chunk_id,
+    doc_id,
+    tf
+from {{ source('warehouse', 'document_terms') }}
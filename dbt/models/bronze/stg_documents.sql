@@ -1,2 +1,10 @@
-select * 
-from {{ source('raw_data', 'documents') }}
+-- bronze.documents is merged by doc_id in pipelines/update_warehouse.py;
+-- the loader's bookkeeping columns are dropped.
+select
+    doc_id,
+    filename,
+    doc_type,
+    content,
+    created_at,
+    file_size
+from {{ source('warehouse', 'documents') }}
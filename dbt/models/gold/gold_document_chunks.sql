@@ -0,0 +1,23 @@
+{{ config(materialized='table') }}
+
+with chunks as (
+    select * from {{ ref('stg_document_chunks') }}
+),
+
+docs as (
+    select * from {{ ref('stg_documents') }}
+)
+
+select
+    c.doc_id || '#' || cast(c.chunk_no as varchar) as chunk_id,
+    c.doc_id,
+    d.filename,
+    d.doc_type,
+    c.page,
+    c.chunk_no,
+    c.char_start,
+    c.char_end,
+    c.token_count,
+    c.text
+from chunks c
+inner join docs d on c.doc_id = d.doc_id
@@ -0,0 +1,14 @@
+-- gold_document_terms.sql
+-- Inverted index used for BM25 retrieval (see search_documents() in
+-- web/src/lib/query_duckdb.py). Sorted by term so lookups only touch the
+-- row groups holding the query terms.
+
+{{ config(materialized='table') }}
+
+select
+    term,
+    chunk_id,
+    doc_id,
+    tf
+from {{ ref('stg_document_terms') }}
+order by term, chunk_id
@@ -2,7 +2,11 @@
 -- Generates demo invoice data from orders
 -- In production, this would come from an actual invoicing system
 
-{{ config(materialized='table') }}
+{{ config(
+    materialized='incremental',
+    unique_key='order_id',
+    incremental_strategy='delete+insert'
+) }}
 
 with orders as (
     select * from {{ ref('int_orders_enriched') }}
@@ -26,9 +30,13 @@ invoices as (
             else (contract_date::date + interval '5 days')::date
         end as actual_invoice_date,
         'JPY' as currency,
-        current_date as snapshot_date
+        current_date as snapshot_date,
+        load_generation
     from orders
     where contract_date is not null
+    {% if is_incremental() %}
+      and load_generation > {{ load_watermark() }}
+    {% endif %}
 )
 
 select * from invoices
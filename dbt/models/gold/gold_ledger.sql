@@ -1,40 +1,16 @@
-with orders as (
-    select * from {{ ref('int_orders_enriched') }}
-),
+-- gold_ledger.sql
+-- Order ledger: the order columns plus billing_status, read from the
+-- single order/invoice/payment join in gold_order_billing.
 
-invoices_agg as (
-    select 
-        order_id, 
-        sum(invoice_amount) as total_invoiced
-    from {{ ref('gold_invoices') }} 
-    group by order_id
-),
-
-payments_agg as (
-    select 
-        order_id, 
-        sum(payment_amount) as total_paid
-    from {{ ref('gold_payments') }} 
-    group by order_id
-),
-
-overdue_orders as (
-    select distinct order_id 
-    from {{ ref('gold_exceptions') }} 
-    where exception_type = 'OVERDUE'
-)
-
-select 
-    o.*,
-    cast(o.contract_amount as double) as amount,
-    o.contract_date as order_date,
-    case 
-        when coalesce(p.total_paid, 0) >= cast(o.contract_amount as double) and cast(o.contract_amount as double) > 0 then 'PAID'
-        when ov.order_id is not null then 'OVERDUE'
-        when coalesce(i.total_invoiced, 0) > 0 then 'BILLED'
-        else 'UNBILLED'
-    end as billing_status
-from orders o
-left join invoices_agg i on o.sequence_no = i.order_id
-left join payments_agg p on o.sequence_no = p.order_id
-left join overdue_orders ov on o.sequence_no = ov.order_id
+select
+    * exclude (
+        invoice_number, invoice_amount, payment_due_date, actual_invoice_date,
+        payment_date, payment_amount, payment_status,
+        days_since_order, days_overdue,
+        is_unbilled, is_overdue, is_amount_mismatch,
+        billing_status
+    ),
+    cast(contract_amount as double) as amount,
+    contract_date as order_date,
+    billing_status
+from {{ ref('gold_order_billing') }}
@@ -0,0 +1,73 @@
+-- gold_order_billing.sql
+-- One row per order with its invoice and payment, joined once.
+-- Everything the gold layer says about an order's billing is derived here:
+-- the exception flags read by gold_exceptions and the billing_status read
+-- by gold_ledger.
+
+{{ config(materialized='table') }}
+
+with orders as (
+    select * from {{ ref('int_orders_enriched') }}
+),
+
+invoices as (
+    select * from {{ ref('gold_invoices') }}
+),
+
+payments as (
+    select * from {{ ref('gold_payments') }}
+),
+
+-- At most one invoice per order and one payment per invoice
+joined as (
+    select
+        o.* exclude (load_generation),
+        i.invoice_number,
+        i.invoice_amount,
+        i.payment_due_date,
+        i.actual_invoice_date,
+        p.payment_date,
+        p.payment_amount,
+        p.payment_status,
+        (current_date - o.contract_date::date) as days_since_order,
+        (current_date - i.payment_due_date) as days_overdue
+    from orders o
+    left join invoices i on o.sequence_no = i.order_id
+    left join payments p on i.order_id = p.order_id
+),
+
+flagged as (
+    select
+        *,
+        -- UNBILLED: not invoiced 7+ days after the order
+        coalesce(
+            actual_invoice_date is null
+            and contract_date is not null
+            and days_since_order > 7,
+            false
+        ) as is_unbilled,
+        -- OVERDUE: invoiced, past due and not fully paid
+        coalesce(
+            actual_invoice_date is not null
+            and payment_due_date < current_date
+            and (payment_date is null or payment_amount < invoice_amount),
+            false
+        ) as is_overdue,
+        -- AMOUNT_MISMATCH: payment differs from invoice by more than 1%
+        coalesce(
+            payment_amount is not null
+            and abs(payment_amount - invoice_amount) > (invoice_amount * 0.01),
+            false
+        ) as is_amount_mismatch
+    from joined
+)
+
+select
+    *,
+    case
+        when coalesce(payment_amount, 0) >= cast(contract_amount as double) and cast(contract_amount as double) > 0 then 'PAID'
+        when is_overdue then 'OVERDUE'
+        when coalesce(invoice_amount, 0) > 0 then 'BILLED'
+        else 'UNBILLED'
+    end as billing_status
+from flagged
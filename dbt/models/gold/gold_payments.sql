@@ -2,7 +2,11 @@
 -- Generates demo payment data from invoices
 -- In production, this would come from bank statements or accounting system
 
-{{ config(materialized='table') }}
+{{ config(
+    materialized='incremental',
+    unique_key='order_id',
+    incremental_strategy='delete+insert'
+) }}
 
 with invoices as (
     select * from {{ ref('gold_invoices') }}
@@ -34,9 +38,13 @@ payments as (
             when hash(order_id) % 5 = 1 then 'PAID_LATE'
             else 'PAID'
         end as payment_status,
-        current_date as snapshot_date
+        current_date as snapshot_date,
+        load_generation
     from invoices
     where actual_invoice_date is not null  -- only invoiced orders can have payments
+    {% if is_incremental() %}
+      and load_generation > {{ load_watermark() }}
+    {% endif %}
 )
 
 select * from payments
@@ -0,0 +1,24 @@
+-- gold_rollup_billing_status.sql
+-- Orders and amounts per order month, organization, contractor and
+-- billing_status: the unbilled/overdue totals behind the KPIs and reports.
+--
+-- Deliberately not incremental, unlike gold_rollup_orders_daily:
+-- billing_status is relative to current_date, so an order can turn OVERDUE
+-- without any load touching it and no generation watermark can find the
+-- status groups that changed. Its input, gold_order_billing, is rebuilt in
+-- full every run for the same reason, so the rollup is one more grouped
+-- pass over it; readers only see the grouped rows.
+
+{{ config(materialized='table') }}
+
+select
+    date_trunc('month', contract_date)::date as order_month,
+    organization_name,
+    contractor_name,
+    billing_status,
+    count(*) as order_count,
+    sum(cast(contract_amount as double)) as total_amount,
+    sum(invoice_amount) as invoice_amount,
+    sum(payment_amount) as payment_amount
+from {{ ref('gold_order_billing') }}
+group by all
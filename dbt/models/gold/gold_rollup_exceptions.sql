@@ -0,0 +1,17 @@
+-- gold_rollup_exceptions.sql
+-- Exception counts and amounts per exception type, severity and organization.
+-- Deliberately not incremental, like gold_exceptions which it groups: ages
+-- and severities follow current_date, not loads (see
+-- gold_rollup_billing_status).
+
+{{ config(materialized='table') }}
+
+select
+    exception_type,
+    severity,
+    organization_name,
+    count(*) as exception_count,
+    sum(amount) as total_amount,
+    max(days_overdue) as max_days_overdue
+from {{ ref('gold_exceptions') }}
+group by all
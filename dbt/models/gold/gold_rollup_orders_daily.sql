@@ -0,0 +1,62 @@
+-- gold_rollup_orders_daily.sql
+-- Order count and amount per order day, organization and contractor.
+-- Dashboards sum these few rows instead of scanning every order.
+--
+-- Incremental (delete+insert on order_day_key): every day an order changed
+-- since the last run moved into *or out of* (int_order_days) is recomputed
+-- from all of that day's orders and replaces the day's previous rows.
+-- order_day_key stands in for order_date so undated orders group too. A
+-- day left with no orders gets a zero row so delete+insert clears it; the
+-- post-hook then drops that row.
+-- depends_on: {{ ref('int_order_days') }}
+
+{{ config(
+    materialized='incremental',
+    unique_key='order_day_key',
+    incremental_strategy='delete+insert',
+    post_hook="delete from {{ this }} where order_count = 0"
+) }}
+
+with orders as (
+    select
+        *,
+        coalesce(cast(contract_date as varchar), 'unknown') as order_day_key
+    from {{ ref('int_orders_enriched') }}
+){% if is_incremental() %},
+
+changed as (
+    select order_day_key, previous_order_day_key
+    from {{ ref('int_order_days') }}
+    where load_generation > {{ load_watermark() }}
+),
+
+affected_days as (
+    select order_day_key from changed
+    union
+    select previous_order_day_key from changed where previous_order_day_key is not null
+){% endif %},
+
+grouped as (
+    select
+        order_day_key,
+        contract_date as order_date,
+        date_trunc('month', contract_date)::date as order_month,
+        organization_name,
+        contractor_name,
+        count(*) as order_count,
+        sum(cast(contract_amount as double)) as total_amount,
+        max(load_generation) as load_generation
+    from orders
+    {% if is_incremental() %}
+    where order_day_key in (select order_day_key from affected_days)
+    {% endif %}
+    group by all
+)
+
+select * from grouped
+{% if is_incremental() %}
+union all by name
+select order_day_key, 0 as order_count, 0.0 as total_amount, '' as load_generation
+from affected_days
+where order_day_key not in (select order_day_key from grouped)
+{% endif %}
@@ -0,0 +1,39 @@
+-- int_order_days.sql
+-- Each order's day in gold_rollup_orders_daily, and the day it had before
+-- its last change. A reload can move an order to another contract_date;
+-- the rollup recomputes both days, so the day the order left does not keep
+-- a stale count.
+--
+-- previous_order_day_key is the key before this model's last run, so the
+-- rollup must be built in the same dbt run (as `dbt run` does) to see it.
+
+{{ config(
+    materialized='incremental',
+    unique_key='sequence_no',
+    incremental_strategy='delete+insert'
+) }}
+
+with orders as (
+    select
+        sequence_no,
+        coalesce(cast(contract_date as varchar), 'unknown') as order_day_key,
+        load_generation
+    from {{ ref('int_orders_enriched') }}
+    {% if is_incremental() %}
+    where load_generation > {{ load_watermark() }}
+    {% endif %}
+)
+
+select
+    o.sequence_no,
+    o.order_day_key,
+    {% if is_incremental() %}
+    p.order_day_key as previous_order_day_key,
+    {% else %}
+    cast(null as varchar) as previous_order_day_key,
+    {% endif %}
+    o.load_generation
+from orders o
+{% if is_incremental() %}
+left join {{ this }} p on o.sequence_no = p.sequence_no
+{% endif %}
@@ -1,14 +1,50 @@
+{{ config(
+    materialized='incremental',
+    unique_key='sequence_no',
+    incremental_strategy='delete+insert'
+) }}
+
 with bids as (
     select * from {{ ref('stg_bids') }}
 ),
 corporate as (
-    select * from {{ source('raw_data', 'corporate') }}
-)
+    select * from {{ source('warehouse', 'corporate') }}
+){% if is_incremental() %},
+
+-- Snapshot loads delete corporate rows that vanished from the master without
+-- leaving a generation behind. Orders that were enriched last run but no
+-- longer find their corporate record are reselected, stamped with the latest
+-- corporate load so downstream watermarks see the change.
+previously_enriched as (
+    select sequence_no from {{ this }}
+    where coalesce(corporate_name, address_prefecture, address_city) is not null
+),
+corporate_load as (
+    select coalesce(max(generation_id), '') as load_generation
+    from {{ source('warehouse', '_load_manifest') }}
+    where source = 'corporate'
+){% endif %}
 
 select 
-    b.*,
+    b.* exclude (load_generation),
     c.corporate_name,
     c.address_prefecture,
-    c.address_city
+    c.address_city,
+    greatest(
+        b.load_generation,
+        coalesce(c.load_generation, '')
+        {%- if is_incremental() %},
+        case when c.corporate_number is null and p.sequence_no is not null then l.load_generation else '' end
+        {%- endif %}
+    ) as load_generation
 from bids b
 left join corporate c on b.corporate_number = c.corporate_number
+{% if is_incremental() %}
+left join previously_enriched p on b.sequence_no = p.sequence_no
+cross join corporate_load l
+-- Only orders loaded since the last run, whose corporate record changed,
+-- or whose corporate record was deleted
+where b.load_generation > {{ load_watermark() }}
+   or c.load_generation > {{ load_watermark() }}
+   or (c.corporate_number is null and p.sequence_no is not null)
+{% endif %}
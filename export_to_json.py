@@ -1,6 +1,21 @@
+import argparse
 import duckdb
-import json
 import os
+import sys
+from pathlib import Path
+
+# Shares the DuckDB-native JSON writer with the pipeline exporter
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pipelines'))
+from export_json import COMPRESSIONS, brotli, copy_to_json, precompress
+
+parser = argparse.ArgumentParser(description="Export gold tables to web/src/lib/*.json")
+parser.add_argument("--compress", default="",
+                    help="Comma-separated precompressed copies to write: gzip, brotli")
+args = parser.parse_args()
+compress = [c.strip() for c in args.compress.split(",") if c.strip() in COMPRESSIONS]
+if "brotli" in compress and brotli is None:
+    print("Warning: brotli is not installed; skipping .br output")
+    compress.remove("brotli")
 
 # Connect to the database (in project root)
 script_dir = os.path.dirname(os.path.abspath(__file__))
@@ -14,12 +29,11 @@ con = duckdb.connect(db_path, read_only=True)
 def export_table(table_name, output_name):
     """Export a dbt table to JSON file"""
     try:
-        df = con.sql(f"SELECT * FROM main_gold.{table_name}").df()
-        rows = df.to_dict(orient='records')
-        output_path = os.path.join(output_dir, f'{output_name}.json')
-        with open(output_path, 'w', encoding='utf-8') as f:
-            json.dump(rows, f, default=str, ensure_ascii=False, indent=2)
-        print(f"✓ Exported {len(rows)} rows from {table_name} to {output_name}.json")
+        # DuckDB writes the JSON array itself (COPY ... FORMAT JSON), no DataFrame round-trip
+        output_path = Path(output_dir) / f'{output_name}.json'
+        rows = copy_to_json(con, f"SELECT * FROM main_gold.{table_name}", output_path)
+        precompress(output_path, compress)
+        print(f"✓ Exported {rows} rows from {table_name} to {output_name}.json")
     except Exception as e:
         print(f"✗ Error exporting {table_name}: {e}")
 
@@ -1,15 +1,38 @@
+import argparse
+import json
+import shutil
+import duckdb
 import requests
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+import codecs
+import csv
 import io
 import zipfile
 import os
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from datetime import datetime
 
 # Configuration
 DATA_DIR = Path("data/raw")
-OUTPUT_FILE = DATA_DIR / "bids_raw.parquet"
-API_BASE_URL = "https://api.p-portal.go.jp/pps-web-biz/UAB03/OAB0301"
+# Hive-partitioned dataset: bids/contract_year=YYYY/contract_month=M/*.parquet
+OUTPUT_DIR = DATA_DIR / "bids"
+# Single-file layout written before partitioning; removed on the next rebuild
+LEGACY_OUTPUT_FILE = DATA_DIR / "bids_raw.parquet"
+# Unpartitioned staging file the CSV chunks are streamed into
+STAGING_FILE = DATA_DIR / "bids_staging.parquet.tmp"
+# Override with BIDS_API_BASE_URL (or --base-url) to point at a local stand-in server
+API_BASE_URL = os.environ.get("BIDS_API_BASE_URL", "https://api.p-portal.go.jp/pps-web-biz/UAB03/OAB0301")
+
+# Raw yearly ZIPs are kept here between runs so unchanged years can be
+# revalidated with a conditional GET instead of downloaded again.
+CACHE_DIR = Path("data/cache/bids")
+CACHE_INDEX = CACHE_DIR / "index.json"  # filename -> {etag, last_modified, size}
+DOWNLOAD_WORKERS = 4
+REQUEST_TIMEOUT = 60
 
 # Column Mapping by Index (0-based)
 # Based on inspection:
@@ -24,87 +47,345 @@ COLUMN_INDICES = {
     7: "corporate_number"
 }
 
-def download_and_process():
+# Output schema (columns missing from a year's CSV are written as nulls)
+BIDS_SCHEMA = pa.schema([
+    ("sequence_no", pa.string()),
+    ("procurement_name", pa.string()),
+    ("contract_date", pa.date32()),
+    ("contract_amount", pa.int64()),
+    ("organization_name", pa.string()),
+    ("contractor_name", pa.string()),
+    ("corporate_number", pa.string()),
+    ("snapshot_date", pa.date32()),
+])
+
+# Streaming sizes: the ZIP is spooled to disk and the CSV is parsed and
+# written to Parquet CSV_CHUNK_ROWS rows (one row group) at a time.
+DOWNLOAD_CHUNK_BYTES = 1 << 20
+CSV_CHUNK_ROWS = 200_000
+# Rows per row group in the partitioned output (min/max stats are kept per group)
+PARTITION_ROW_GROUP_SIZE = 100_000
+# Bytes read from the CSV to detect encoding and column count
+SNIFF_BYTES = 64 * 1024
+
+# Full-width digits and separators seen in the portal's CSVs
+FULLWIDTH_TO_ASCII = str.maketrans("０１２３４５６７８９，．－／：　", "0123456789,.-/: ")
+# Currency symbols, thousands separators and whitespace stripped from amounts
+AMOUNT_NOISE = r"[,\s円¥￥\\]"
+AMOUNT_NUMBER = r"^-?\d+(\.\d+)?$"
+
+# Tried in order; each format only parses the rows the previous ones rejected
+DATE_FORMATS = ["%Y-%m-%d", "%Y/%m/%d", "%Y%m%d", "%Y年%m月%d日", "%Y.%m.%d"]
+# Japanese era dates such as 令和5年4月1日 / R5.4.1 (元年 = year 1)
+ERA_DATE = r"^(令和|平成|R|H)\s*(元|\d{1,2})\s*[年./-]\s*(\d{1,2})\s*[月./-]\s*(\d{1,2})\s*日?$"
+ERA_OFFSETS = {"令和": 2018, "R": 2018, "平成": 1988, "H": 1988}
+
+def zip_filename(year):
+    return f"successful_bid_record_info_all_{year}.zip"
+
+def load_cache_index():
+    if not CACHE_INDEX.exists():
+        return {}
+    with open(CACHE_INDEX, encoding="utf-8") as f:
+        return json.load(f)
+
+def fetch_year(year, cached, base_url=API_BASE_URL):
+    """
+    Download one year's ZIP into CACHE_DIR, revalidating a cached copy with
+    If-None-Match / If-Modified-Since. Returns (status, metadata) where status
+    is "downloaded", "unchanged", "stale" (the request failed but a cached ZIP
+    is on disk and is used as is) or "failed".
+    """
+    filename = zip_filename(year)
+    path = CACHE_DIR / filename
+    download_url = f"{base_url}?fileversion=v001&filename={filename}"
+
+    headers = {}
+    # Only trust the cache entry if the file on disk is the one it describes
+    if cached and path.exists() and path.stat().st_size == cached.get("size"):
+        if cached.get("etag"):
+            headers["If-None-Match"] = cached["etag"]
+        if cached.get("last_modified"):
+            headers["If-Modified-Since"] = cached["last_modified"]
+
+    print(f"Trying to download: {download_url}...")
+    try:
+        with requests.get(download_url, headers=headers, stream=True, timeout=REQUEST_TIMEOUT) as resp:
+            if resp.status_code == 304:
+                print(f"Year {year} unchanged (cached {filename}).")
+                return "unchanged", cached
+            if resp.status_code != 200:
+                return fall_back_to_cache(year, path, cached, f"Status: {resp.status_code}")
+
+            part_path = path.with_suffix(".zip.part")
+            with open(part_path, "wb") as f:
+                for block in resp.iter_content(chunk_size=DOWNLOAD_CHUNK_BYTES):
+                    f.write(block)
+            os.replace(part_path, path)
+
+            print(f"Download successful for year {year}!")
+            return "downloaded", {
+                "etag": resp.headers.get("ETag"),
+                "last_modified": resp.headers.get("Last-Modified"),
+                "size": path.stat().st_size,
+            }
+    except Exception as e:
+        return fall_back_to_cache(year, path, cached, e)
+
+def fall_back_to_cache(year, path, cached, reason):
+    """
+    A failed request must not drop a year from the rebuild: keep using the
+    cached ZIP if there is one, so its rows stay in OUTPUT_DIR.
+    """
+    if path.exists():
+        print(f"Warning: failed to download year {year} ({reason}); using cached {path.name}.")
+        return "stale", cached
+    print(f"Failed to download for year {year}. {reason}")
+    return "failed", None
+
+def download_and_process(years=None, base_url=API_BASE_URL, workers=DOWNLOAD_WORKERS, force=False):
+    """
+    Fetch the given years concurrently (default: current and previous year)
+    and rebuild OUTPUT_DIR from every available ZIP. If no year changed
+    since the last run, the existing output is left as is.
+    """
     os.makedirs(DATA_DIR, exist_ok=True)
-    
-    current_year = datetime.now().year
-    target_years = [current_year, current_year - 1]
-    
-    for year in target_years:
-        filename = f"successful_bid_record_info_all_{year}.zip"
-        download_url = f"{API_BASE_URL}?fileversion=v001&filename={filename}"
-        print(f"Trying to download: {download_url}...")
-        
+    os.makedirs(CACHE_DIR, exist_ok=True)
+
+    if years is None:
+        current_year = datetime.now().year
+        years = [current_year, current_year - 1]
+
+    index = load_cache_index()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = dict(zip(years, pool.map(
+            lambda year: fetch_year(year, index.get(zip_filename(year)), base_url), years
+        )))
+
+    for year, (status, meta) in results.items():
+        if status in ("downloaded", "unchanged"):
+            index[zip_filename(year)] = meta
+    with open(CACHE_INDEX, "w", encoding="utf-8") as f:
+        json.dump(index, f, indent=2, sort_keys=True)
+
+    available = [year for year in sorted(years, reverse=True) if results[year][0] != "failed"]
+    downloaded = [year for year in available if results[year][0] == "downloaded"]
+    stale = [year for year in available if results[year][0] == "stale"]
+    print(f"Years: {len(downloaded)} downloaded, {len(available) - len(downloaded) - len(stale)} unchanged, "
+          f"{len(stale)} from stale cache, {len(years) - len(available)} failed")
+
+    if not available:
+        print("Failed to download data for all attempted years.")
+        return
+    if not downloaded and OUTPUT_DIR.exists() and not force:
+        print(f"No changes; keeping {OUTPUT_DIR}.")
+        return
+
+    process_zips([CACHE_DIR / zip_filename(year) for year in available])
+
+def sniff_csv(f):
+    """
+    Detect the encoding and column count of a headerless CSV from its first bytes.
+    Returns (encoding, n_columns).
+    """
+    sample = f.read(SNIFF_BYTES)
+    # Incremental decoding tolerates a multi-byte character cut at the sample boundary
+    for encoding in ("utf-8-sig", "cp932"):
         try:
-            resp = requests.get(download_url)
-            if resp.status_code == 200:
-                print(f"Download successful for year {year}!")
-                process_response(resp)
-                return
-            else:
-                print(f"Failed to download for year {year}. Status: {resp.status_code}")
-        except Exception as e:
-            print(f"Error downloading year {year}: {e}")
-
-    print("Failed to download data for all attempted years.")
-
-def process_response(resp):
+            text = codecs.getincrementaldecoder(encoding)().decode(sample, final=False)
+            break
+        except UnicodeDecodeError:
+            continue
+    first_row = next(csv.reader(io.StringIO(text)), [])
+    return encoding, len(first_row)
+
+def to_ascii(text):
+    """Map full-width digits and separators to ASCII, touching only non-ASCII rows."""
+    non_ascii = text.notna() & ~text.fillna("").str.isascii()
+    if non_ascii.any():
+        text = text.copy()
+        text[non_ascii] = text[non_ascii].str.translate(FULLWIDTH_TO_ASCII)
+    return text
+
+def parse_amounts(raw):
+    """
+    Parse amount strings to nullable Int64 yen with Arrow compute kernels
+    (no per-row Python calls). Returns (amounts, n_rejected), counting
+    non-blank values that are not a number once separators are stripped.
+    """
+    text = pa.array(to_ascii(raw), type=pa.string(), from_pandas=True)
+    text = pc.replace_substring_regex(text, AMOUNT_NOISE, "")
+    valid = pc.match_substring_regex(text, AMOUNT_NUMBER)
+    amounts = pc.round(pc.cast(pc.if_else(valid, text, pa.scalar(None, pa.string())), pa.float64()))
+    rejected = pc.sum(pc.and_(pc.invert(valid), pc.not_equal(text, ""))).as_py() or 0
+    return pd.Series(pc.cast(amounts, pa.int64()), index=raw.index, dtype="Int64"), rejected
+
+def parse_dates(raw):
+    """
+    Parse date strings with explicit formats (see DATE_FORMATS / ERA_DATE)
+    instead of per-value inference. Returns (dates, n_rejected).
+    """
+    text = to_ascii(raw).str.strip()
+    dates = pd.Series(pd.NaT, index=raw.index, dtype="datetime64[ns]")
+
+    is_era = text.str.match(r"(令和|平成|R|H)").fillna(False).astype(bool)
+    if is_era.any():
+        era = text[is_era].str.extract(ERA_DATE).dropna()
+        years = era[0].map(ERA_OFFSETS) + era[1].replace("元", "1").astype(int)
+        dates[era.index] = pd.to_datetime(
+            pd.DataFrame({"year": years, "month": era[2].astype(int), "day": era[3].astype(int)}),
+            errors="coerce",
+        )
+
+    # Drop a trailing time part ("2024/04/01 0:00:00")
+    text = text.str.replace(r"[ T]\d{1,2}:\d{2}(:\d{2})?.*$", "", regex=True)
+    for fmt in DATE_FORMATS:
+        pending = dates.isna() & ~is_era & text.notna()
+        if not pending.any():
+            break
+        dates[pending] = pd.to_datetime(text[pending], format=fmt, errors="coerce")
+
+    rejected = dates.isna() & text.fillna("").ne("")
+    # Kept as datetime64; the Arrow schema casts to date32 on write
+    return dates, int(rejected.sum())
+
+def clean_bids(df):
+    """
+    Type the raw string columns of one CSV chunk.
+    Values that fail to parse become null; returns (df, rejected counts by column).
+    """
+    rejected = {}
+    if "contract_date" in df.columns:
+        df["contract_date"], rejected["contract_date"] = parse_dates(df["contract_date"])
+
+    if "contract_amount" in df.columns:
+        df["contract_amount"], rejected["contract_amount"] = parse_amounts(df["contract_amount"])
+
+    # Add metadata
+    df["snapshot_date"] = datetime.now().date()
+    return df, rejected
+
+def write_zip(zip_path, writer):
+    """
+    Append the CSV inside one ZIP to an open ParquetWriter in bounded memory:
+    only the COLUMN_INDICES columns are parsed, CSV_CHUNK_ROWS rows at a time,
+    and each chunk becomes its own row group. Returns the number of rows.
+    """
+    with zipfile.ZipFile(zip_path) as z:
+        csv_files = [f for f in z.namelist() if f.endswith('.csv')]
+        if not csv_files:
+            print(f"No CSV found in {zip_path}.")
+            return 0
+
+        target_csv = csv_files[0]
+        print(f"Processing CSV from ZIP: {target_csv}")
+
+        with z.open(target_csv) as f:
+            encoding, n_columns = sniff_csv(f)
+
+        columns = {idx: name for idx, name in COLUMN_INDICES.items() if idx < n_columns}
+
+        total_rows = 0
+        rejected = dict.fromkeys(["contract_date", "contract_amount"], 0)
+        with z.open(target_csv) as f:
+            # Read CSV without header, force strings for IDs
+            reader = pd.read_csv(
+                f, encoding=encoding, header=None, dtype=str,
+                usecols=list(columns), chunksize=CSV_CHUNK_ROWS
+            )
+            for chunk in reader:
+                # Select and Rename Columns
+                chunk, chunk_rejected = clean_bids(chunk[list(columns)].rename(columns=columns))
+                for column, count in chunk_rejected.items():
+                    rejected[column] += count
+                for field in BIDS_SCHEMA:
+                    if field.name not in chunk.columns:
+                        chunk[field.name] = None
+                writer.write_table(pa.Table.from_pandas(chunk, schema=BIDS_SCHEMA, preserve_index=False))
+                total_rows += len(chunk)
+                print(f"  {total_rows} rows written...", flush=True)
+
+        print("  Rejected values (stored as null): " + ", ".join(f"{k}={v}" for k, v in rejected.items()))
+    return total_rows
+
+def write_partitioned(staging_file, output_dir):
+    """
+    Rewrite the staging parquet as a Hive-partitioned dataset under output_dir.
+    Rows are sorted by contract_date so each file's row groups cover narrow
+    date ranges and their min/max statistics can prune date-bounded scans.
+    DuckDB sorts out of core, so this stays within bounded memory as well.
+    Rows without a contract_date land in the __HIVE_DEFAULT_PARTITION__ (NULL) partition.
+    """
+    tmp_dir = output_dir.with_name(output_dir.name + ".tmp")
+    if tmp_dir.exists():
+        shutil.rmtree(tmp_dir)
+
+    con = duckdb.connect()
     try:
-        with zipfile.ZipFile(io.BytesIO(resp.content)) as z:
-            csv_files = [f for f in z.namelist() if f.endswith('.csv')]
-            if not csv_files:
-                print("No CSV found in ZIP.")
-                return
-            
-            target_csv = csv_files[0]
-            print(f"Processing CSV from ZIP: {target_csv}")
-            
-            with z.open(target_csv) as f:
-                # Read CSV without header, force strings for IDs
-                # Use utf-8-sig for BOM
-                try:
-                    df = pd.read_csv(f, encoding='utf-8-sig', header=None, dtype=str)
-                except UnicodeDecodeError:
-                    f.seek(0)
-                    df = pd.read_csv(f, encoding='cp932', header=None, dtype=str)
-                
-        print(f"Raw data loaded: {len(df)} rows.")
-        
-        # Select and Rename Columns
-        # Create a new DF with the mapped columns
-        new_df = pd.DataFrame()
-        
-        for idx, name in COLUMN_INDICES.items():
-            if idx < len(df.columns):
-                new_df[name] = df[idx]
-        
-        df = new_df
-        
-        # Data Cleaning
-        if "contract_date" in df.columns:
-             df["contract_date"] = pd.to_datetime(df["contract_date"], errors='coerce').dt.date
-        
-        if "contract_amount" in df.columns:
-            # Handle possible commas or non-numeric
-            df["contract_amount"] = (
-                df["contract_amount"]
-                .astype(str)
-                .str.replace(',', '')
-                .apply(pd.to_numeric, errors='coerce')
+        con.execute(f"""
+            COPY (
+                SELECT *,
+                    year(contract_date) AS contract_year,
+                    month(contract_date) AS contract_month
+                FROM read_parquet('{staging_file.as_posix()}')
+                ORDER BY contract_date, sequence_no
+            ) TO '{tmp_dir.as_posix()}' (
+                FORMAT PARQUET,
+                PARTITION_BY (contract_year, contract_month),
+                ROW_GROUP_SIZE {PARTITION_ROW_GROUP_SIZE}
             )
-        
-        # Add metadata
-        df["snapshot_date"] = datetime.now().date()
-        
+        """)
+        partitions = con.execute(f"""
+            SELECT count(DISTINCT filename) FROM read_parquet('{tmp_dir.as_posix()}/*/*/*.parquet', filename=true)
+        """).fetchone()[0]
+    finally:
+        con.close()
+
+    # Swap the new dataset in place of the old one
+    old_dir = output_dir.with_name(output_dir.name + ".old")
+    if output_dir.exists():
+        os.replace(output_dir, old_dir)
+    os.replace(tmp_dir, output_dir)
+    if old_dir.exists():
+        shutil.rmtree(old_dir)
+    return partitions
+
+def process_zips(zip_paths):
+    """Rebuild OUTPUT_DIR from the given yearly ZIPs."""
+    try:
+        total_rows = 0
+        with pq.ParquetWriter(STAGING_FILE, BIDS_SCHEMA) as writer:
+            for zip_path in zip_paths:
+                total_rows += write_zip(zip_path, writer)
+
         # Save
-        print(f"Saving to {OUTPUT_FILE}...")
-        df.to_parquet(OUTPUT_FILE, index=False)
+        partitions = write_partitioned(STAGING_FILE, OUTPUT_DIR)
+        if LEGACY_OUTPUT_FILE.exists():
+            LEGACY_OUTPUT_FILE.unlink()
+        print(f"Saved {total_rows} rows to {OUTPUT_DIR} ({partitions} partition files)")
         print("Success! Real procurement data pipeline completed.")
 
     except Exception as e:
         print(f"Processing failed: {e}")
         import traceback
         traceback.print_exc()
+    finally:
+        if STAGING_FILE.exists():
+            STAGING_FILE.unlink()
 
 if __name__ == "__main__":
-    download_and_process()
+    parser = argparse.ArgumentParser(description="Download successful bid records from the procurement portal")
+    parser.add_argument("--from-year", type=int, help="First year to fetch (default: previous year)")
+    parser.add_argument("--to-year", type=int, help="Last year to fetch (default: current year)")
+    parser.add_argument("--workers", type=int, default=DOWNLOAD_WORKERS, help="Concurrent downloads")
+    parser.add_argument("--base-url", default=API_BASE_URL, help="Download endpoint (e.g. a local stand-in)")
+    parser.add_argument("--force", action="store_true", help="Rebuild the output even if nothing changed")
+    args = parser.parse_args()
+
+    years = None
+    if args.from_year or args.to_year:
+        to_year = args.to_year or datetime.now().year
+        from_year = args.from_year or to_year - 1
+        years = list(range(to_year, from_year - 1, -1))
+
+    download_and_process(years, args.base_url, args.workers, args.force)
@@ -1,5 +1,12 @@
-import pandas as pd
+import argparse
+import codecs
+import json
 import os
+import shutil
+import tempfile
+import zipfile
+import duckdb
+import pandas as pd
 from pathlib import Path
 from datetime import datetime
 
@@ -7,6 +14,38 @@ from datetime import datetime
 DATA_DIR = Path("data/raw")
 SOURCE_FILE = DATA_DIR / "corporate_source.csv"
 OUTPUT_FILE = DATA_DIR / "corporate_raw.parquet"
+# Which NTA files OUTPUT_FILE was built from, so diff files are applied once
+MANIFEST_FILE = DATA_DIR / "corporate_manifest.json"
+
+# NTA corporate number bulk data (法人番号公表サイト 全件/差分データ, CSV形式).
+# The files have no header; columns by 1-based position in the published spec,
+# mapped to the names used downstream. Everything is read as text.
+NTA_COLUMNS = {
+    1: "sequence_number",             # 一連番号
+    2: "corporate_number",            # 法人番号
+    3: "process",                     # 処理区分
+    5: "update_date",                 # 更新年月日
+    6: "change_date",                 # 変更年月日
+    7: "corporate_name",              # 商号又は名称
+    9: "kind",                        # 法人種別
+    10: "address_prefecture",         # 国内所在地（都道府県）
+    11: "address_city",               # 国内所在地（市区町村）
+    12: "address_street",             # 国内所在地（丁目番地等）
+    16: "post_code",                  # 郵便番号
+    19: "close_date",                 # 登記記録の閉鎖等年月日
+    21: "successor_corporate_number", # 承継先法人番号
+}
+NTA_COLUMN_COUNT = 30
+# 処理区分 99: the corporate number was deleted
+PROCESS_DELETED = "99"
+# Columns written to OUTPUT_FILE (besides snapshot_date), sorted by corporate_number
+MASTER_COLUMNS = [
+    "corporate_number", "corporate_name", "kind",
+    "address_prefecture", "address_city", "address_street", "post_code",
+    "process", "update_date", "change_date", "close_date", "successor_corporate_number",
+]
+# Bytes per read when transcoding
+TRANSCODE_CHUNK_BYTES = 1 << 20
 
 def create_sample_corporate_csv():
     """Create a sample CSV if source doesn't exist for demo purposes."""
@@ -27,6 +66,12 @@ def run_pipeline():
     # Ensure directory exists
     os.makedirs(DATA_DIR, exist_ok=True)
 
+    # An NTA import (--full) is the real master; the daily run without files
+    # must not replace it with the demo sample
+    if load_manifest().get("full"):
+        print(f"{OUTPUT_FILE} holds an NTA import; keeping it (use --diff to update it).")
+        return
+
     # 1. Check for source file
     if not SOURCE_FILE.exists():
         print(f"Source file {SOURCE_FILE} not found.")
@@ -35,7 +80,7 @@ def run_pipeline():
     # 2. Load and Transform
     print(f"Loading {SOURCE_FILE}...")
     try:
-        df = pd.read_csv(SOURCE_FILE)
+        df = pd.read_csv(SOURCE_FILE, dtype={"corporate_number": str})
         
         # Add metadata
         df["snapshot_date"] = datetime.now().date()
@@ -43,10 +88,154 @@ def run_pipeline():
         # 3. Save as Parquet
         print(f"Saving to {OUTPUT_FILE}...")
         df.to_parquet(OUTPUT_FILE, index=False)
+        # The master is no longer the NTA import the manifest describes, so
+        # a later --diff must not be applied on top of it
+        if MANIFEST_FILE.exists():
+            MANIFEST_FILE.unlink()
+            print(f"Removed {MANIFEST_FILE}; run with --full before applying NTA diffs.")
         print("Success! Corporate data pipeline completed.")
         
     except Exception as e:
         print(f"Error processing corporate data: {e}")
 
+def open_nta_csv(path):
+    """Open an NTA download (.zip holding one CSV, or a bare .csv) as a binary stream."""
+    path = Path(path)
+    if path.suffix.lower() != ".zip":
+        return open(path, "rb")
+    z = zipfile.ZipFile(path)
+    csv_files = [f for f in z.namelist() if f.lower().endswith(".csv")]
+    if not csv_files:
+        raise ValueError(f"No CSV found in {path}")
+    return z.open(csv_files[0])
+
+def transcode_to_utf8(path, out):
+    """
+    Stream an NTA CSV into the open binary file `out` as UTF-8.
+    The Shift-JIS (cp932) and Unicode (UTF-8) editions are told apart by
+    whether the first block decodes as UTF-8; memory use is one block.
+    """
+    with open_nta_csv(path) as f:
+        block = f.read(TRANSCODE_CHUNK_BYTES)
+        try:
+            codecs.getincrementaldecoder("utf-8-sig")().decode(block, final=False)
+            encoding = "utf-8-sig"
+        except UnicodeDecodeError:
+            encoding = "cp932"
+
+        decoder = codecs.getincrementaldecoder(encoding)()
+        while block:
+            out.write(decoder.decode(block).encode("utf-8"))
+            block = f.read(TRANSCODE_CHUNK_BYTES)
+        out.write(decoder.decode(b"", final=True).encode("utf-8"))
+    return encoding
+
+def nta_relation(csv_path, file_order):
+    """DuckDB relation over a transcoded NTA CSV, projected to NTA_COLUMNS."""
+    columns = ", ".join(f"'column{i - 1:02d}': 'VARCHAR'" for i in range(1, NTA_COLUMN_COUNT + 1))
+    projection = ", ".join(f"column{i - 1:02d} AS {name}" for i, name in NTA_COLUMNS.items())
+    return f"""
+        SELECT {projection}, {file_order} AS file_order
+        FROM read_csv('{Path(csv_path).as_posix()}', header = false, quote = '"',
+                      columns = {{{columns}}}, null_padding = true)
+    """
+
+def build_master(relations, base=None):
+    """
+    SQL for the master table: the latest record per corporate_number across
+    `base` (the current OUTPUT_FILE) and the NTA relations, later files
+    winning and then the highest 一連番号; numbers whose latest record is a
+    deletion are dropped. Sorted by corporate_number so lookups and joins on
+    it only touch the matching row groups.
+    """
+    inputs = list(relations)
+    if base is not None:
+        keep = ", ".join(MASTER_COLUMNS)
+        inputs.insert(0, f"SELECT {keep}, NULL AS sequence_number, -1 AS file_order FROM read_parquet('{Path(base).as_posix()}')")
+    unioned = "\nUNION ALL BY NAME\n".join(f"({r})" for r in inputs)
+    return f"""
+        SELECT {", ".join(MASTER_COLUMNS)}, current_date AS snapshot_date
+        FROM ({unioned})
+        WHERE corporate_number IS NOT NULL
+        QUALIFY row_number() OVER (
+            PARTITION BY corporate_number
+            ORDER BY file_order DESC, try_cast(sequence_number AS BIGINT) DESC NULLS LAST
+        ) = 1
+           AND coalesce(process, '') <> '{PROCESS_DELETED}'
+        ORDER BY corporate_number
+    """
+
+def load_manifest():
+    if not (MANIFEST_FILE.exists() and OUTPUT_FILE.exists()):
+        return {}
+    with open(MANIFEST_FILE, encoding="utf-8") as f:
+        return json.load(f)
+
+def import_nta(full_files=None, diff_files=None):
+    """
+    Build OUTPUT_FILE from NTA bulk files.
+    full_files (全件, e.g. one file per prefecture or the national file)
+    replace the master; diff_files (差分) are applied on top of it in the
+    given order, skipping files already applied. Files are transcoded to
+    UTF-8 one at a time; deduplication and sorting run in DuckDB, which
+    spills to disk, so memory stays bounded at national scale (~5M rows).
+    """
+    os.makedirs(DATA_DIR, exist_ok=True)
+    full_files = [Path(p) for p in full_files or []]
+    manifest = {} if full_files else load_manifest()
+    if not full_files and not manifest.get("full"):
+        print(f"{OUTPUT_FILE} was not built from NTA full files; run with --full first.")
+        return
+
+    applied = set(manifest.get("diffs", []))
+    diff_files = [Path(p) for p in diff_files or [] if Path(p).name not in applied]
+    if not full_files and not diff_files:
+        print(f"{OUTPUT_FILE} is up to date.")
+        return
+
+    tmp_dir = Path(tempfile.mkdtemp(prefix="nta_", dir=DATA_DIR))
+    tmp_output = OUTPUT_FILE.with_suffix(".parquet.tmp")
+    con = duckdb.connect()
+    try:
+        con.execute(f"SET temp_directory = '{(tmp_dir / 'spill').as_posix()}'")
+        relations = []
+        for order, path in enumerate(full_files + diff_files):
+            csv_path = tmp_dir / f"{order:04d}.csv"
+            with open(csv_path, "wb") as out:
+                encoding = transcode_to_utf8(path, out)
+            print(f"Staged {path.name} ({encoding})")
+            relations.append(nta_relation(csv_path, order))
+
+        base = None if full_files else OUTPUT_FILE
+        con.execute(f"COPY ({build_master(relations, base)}) TO '{tmp_output.as_posix()}' (FORMAT PARQUET)")
+        os.replace(tmp_output, OUTPUT_FILE)
+
+        manifest = {
+            "full": [p.name for p in full_files] if full_files else manifest.get("full", []),
+            "diffs": ([] if full_files else manifest.get("diffs", [])) + [p.name for p in diff_files],
+        }
+        with open(MANIFEST_FILE, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+        rows = con.execute(f"SELECT COUNT(*) FROM read_parquet('{OUTPUT_FILE.as_posix()}')").fetchone()[0]
+        print(f"Saved {rows} corporations to {OUTPUT_FILE} "
+              f"({len(full_files)} full, {len(diff_files)} diff file(s) applied)")
+    finally:
+        con.close()
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        if tmp_output.exists():
+            tmp_output.unlink()
+
 if __name__ == "__main__":
-    run_pipeline()
+    parser = argparse.ArgumentParser(description="Build the corporate master (corporate_raw.parquet)")
+    parser.add_argument("--full", nargs="+", metavar="FILE",
+                        help="NTA full (全件) ZIP/CSV files; replaces the master")
+    parser.add_argument("--diff", nargs="+", metavar="FILE",
+                        help="NTA diff (差分) ZIP/CSV files, oldest first; applied to the master")
+    args = parser.parse_args()
+
+    if args.full or args.diff:
+        import_nta(args.full, args.diff)
+    else:
+        # No NTA files given: demo sample data
+        run_pipeline()
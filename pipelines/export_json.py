@@ -2,14 +2,38 @@
 """
 export_json.py
 Export Gold layer tables from DuckDB to JSON for Vercel/Next.js consumption.
+
+--mode legacy (default) writes one capped JSON array per table into --out.
+--mode sharded writes every row as fixed-size page files plus an index.json
+manifest per table under --shard-out (see export_table_shards), which the
+frontend loads a page at a time (see web/src/lib/data.ts).
+--delta (sharded mode) only rewrites pages whose content changed.
+
+--engine duckdb (default) has DuckDB write the JSON itself with
+COPY ... TO (FORMAT JSON, ARRAY true), so rows never pass through pandas or
+Python objects; --engine python keeps the json.dump path. --compress writes
+precompressed .gz / .br copies next to every file for static hosting.
+
+--mode parquet writes every main_gold table as <table>.parquet under
+--parquet-out instead (see export_table_parquet): typed columns and
+row-group min/max statistics, so readers such as web/src/lib/query_duckdb.py
+can query the files directly when warehouse.duckdb is not deployed.
 """
 import argparse
 import duckdb
+import gzip
 import json
+import os
+import shutil
 from pathlib import Path
 from datetime import datetime, date
 from decimal import Decimal
 
+try:
+    import brotli
+except ImportError:  # optional: only needed for --compress brotli
+    brotli = None
+
 
 def json_serializer(obj):
     """Custom JSON serializer for types not handled by default."""
@@ -20,7 +44,252 @@ def json_serializer(obj):
     raise TypeError(f"Object of type {type(obj)} is not JSON serializable")
 
 
-def export_table_to_json(con, table_name: str, output_path: Path):
+ENGINES = ("duckdb", "python")
+COMPRESSIONS = ("gzip", "brotli")
+COMPRESSED_SUFFIX = {"gzip": ".gz", "brotli": ".br"}
+
+
+def copy_to_json(con, sql: str, output_path: Path) -> int:
+    """
+    Write the rows of `sql` as one JSON array with DuckDB's own writer,
+    replacing output_path atomically. Returns the row count.
+    """
+    tmp = output_path.with_name(output_path.name + ".tmp")
+    posix = tmp.as_posix().replace("'", "''")
+    rows = con.execute(f"COPY ({sql}) TO '{posix}' (FORMAT JSON, ARRAY true)").fetchone()[0]
+    os.replace(tmp, output_path)
+    return rows
+
+
+def precompress(path: Path, compress=()):
+    """Write compressed copies of path (path.gz / path.br) for servers that serve them directly."""
+    for codec in compress:
+        target = path.with_name(path.name + COMPRESSED_SUFFIX[codec])
+        tmp = target.with_name(target.name + ".tmp")
+        if codec == "gzip":
+            with open(path, "rb") as src, gzip.open(tmp, "wb", compresslevel=9) as dst:
+                shutil.copyfileobj(src, dst, 1 << 20)
+        else:
+            compressor = brotli.Compressor(quality=11)
+            with open(path, "rb") as src, open(tmp, "wb") as dst:
+                for block in iter(lambda: src.read(1 << 20), b""):
+                    dst.write(compressor.process(block))
+                dst.write(compressor.finish())
+        os.replace(tmp, target)
+
+
+def remove_with_compressed(path: Path):
+    for candidate in [path] + [path.with_name(path.name + suffix) for suffix in COMPRESSED_SUFFIX.values()]:
+        if candidate.exists():
+            candidate.unlink()
+
+
+# Shard layout: <shard-out>/<dataset>/index.json + page-0001.json, ...
+SHARD_PAGE_SIZE = 500
+SHARD_PAGE_FILE = "page-{:04d}.json"
+
+# Display order of each table's rows as (column, direction), nulls last; the
+# trailing key makes it total. Shards are cut from the *other* end (page-0001
+# holds the oldest rows, the newest shard may be partial), so new rows at the
+# top of the display order only touch the newest shard and the others keep
+# their content between exports.
+SHARD_SORT = {
+    "main_gold.gold_ledger": [("order_date", "DESC"), ("sequence_no", "DESC")],
+    "main_gold.gold_exceptions": [("detected_date", "DESC"), ("order_id", "ASC"), ("exception_type", "ASC")],
+    "main_gold.gold_invoices": [("invoice_date", "DESC"), ("order_id", "ASC")],
+    "main_gold.gold_payments": [("payment_due_date", "DESC"), ("order_id", "ASC")],
+}
+# Columns left out of the --delta row hash because the daily dbt build
+# restamps them without any source change (cf. VOLATILE_COLUMNS in
+# update_warehouse.py): snapshot/detected dates are current_date and the
+# day counts are measured from it. A page that is otherwise unchanged is
+# kept as written, so in delta output these columns (and the first/last
+# detected_date keys in index.json) are as of the export that last wrote
+# that page, not today; derive ages from order_date / due_date and the
+# index's generated_at instead. Date-driven transitions that matter, such
+# as billing_status turning OVERDUE or an exception's severity rising, are
+# still in the hash and do rewrite the page.
+SHARD_VOLATILE_COLUMNS = {
+    "snapshot_date", "detected_date", "days_since_order", "days_overdue",
+    "load_generation", "ingested_at", "created_at",
+}
+# Column whose value counts are recorded in the manifest
+SHARD_STATUS_COLUMN = {
+    "main_gold.gold_ledger": "billing_status",
+    "main_gold.gold_exceptions": "exception_type",
+    "main_gold.gold_payments": "payment_status",
+}
+
+
+def write_json_atomic(path: Path, data, **kwargs):
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, default=json_serializer, **kwargs)
+    os.replace(tmp, path)
+
+
+def order_clause(sort, reverse=False):
+    terms = []
+    for column, direction in sort:
+        if reverse:
+            terms.append(f"{column} {'ASC' if direction == 'DESC' else 'DESC'} NULLS FIRST")
+        else:
+            terms.append(f"{column} {direction} NULLS LAST")
+    return ", ".join(terms)
+
+
+def load_shard_index(out_dir: Path):
+    try:
+        with open(out_dir / "index.json", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def iter_shards(cursor, columns, batch_size):
+    """Yield (shard, records) from a cursor ordered by shard, one shard in memory at a time."""
+    shard, records = None, []
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        for row in rows:
+            if row[-1] != shard and records:
+                yield shard, records
+                records = []
+            shard = row[-1]
+            records.append(dict(zip(columns, row[:-1])))
+    if records:
+        yield shard, records
+
+
+def export_table_shards(con, table_name: str, out_dir: Path, page_size: int = SHARD_PAGE_SIZE, delta: bool = False,
+                        engine: str = "duckdb", compress=()):
+    """
+    Export every row of a table as page files of page_size rows plus an
+    index.json manifest: total rows, page size/count, each page's file,
+    display offset, row count, content hash and first/last sort keys, and
+    per-status counts. Pages are listed in display order.
+
+    With delta=True, each shard's hash (DuckDB md5 over its rows' JSON,
+    without SHARD_VOLATILE_COLUMNS) is compared with the previous manifest
+    and only shards whose content changed are fetched and rewritten; if
+    nothing changed at all, the manifest is left untouched as well.
+    """
+    try:
+        out_dir.mkdir(parents=True, exist_ok=True)
+        sort = SHARD_SORT.get(table_name, [])
+        sort_columns = [column for column, _ in sort]
+        display_order = order_clause(sort) or "1"
+        shard_order = order_clause(sort, reverse=True) or "1"
+        columns = [row[0] for row in con.execute(f"DESCRIBE {table_name}").fetchall()]
+        hashed = ", ".join(
+            f'"{c}" := t."{c}"' for c in columns if c not in SHARD_VOLATILE_COLUMNS
+        )
+
+        con.execute(f"""
+            CREATE OR REPLACE TEMP TABLE shard_rows AS
+            SELECT t.*,
+                md5(to_json(struct_pack({hashed}))) AS __row_hash,
+                (row_number() OVER (ORDER BY {shard_order}) - 1) // {int(page_size)} AS __shard
+            FROM {table_name} t
+        """)
+        shards = con.execute(f"""
+            SELECT __shard, COUNT(*), md5(string_agg(__row_hash, '' ORDER BY {display_order}))
+            FROM shard_rows GROUP BY __shard ORDER BY __shard
+        """).fetchall()
+
+        previous = load_shard_index(out_dir) if delta else None
+        if previous and previous.get("page_size") == page_size:
+            previous_pages = {p["file"]: p for p in previous.get("pages", []) if p.get("hash")}
+        else:
+            previous_pages = {}
+
+        entries = {}
+        changed = []
+        for shard, rows, digest in shards:
+            filename = SHARD_PAGE_FILE.format(shard + 1)
+            old = previous_pages.get(filename)
+            if old and old["hash"] == digest and old["rows"] == rows and (out_dir / filename).exists():
+                entries[shard] = dict(old)
+            else:
+                entries[shard] = {"file": filename, "rows": rows, "hash": digest}
+                changed.append(shard)
+
+        if changed and engine == "duckdb":
+            key_list = ", ".join(sort_columns) or "*"
+            for shard in changed:
+                path = out_dir / entries[shard]["file"]
+                shard_sql = f"SELECT * EXCLUDE (__row_hash, __shard) FROM shard_rows WHERE __shard = {shard}"
+                copy_to_json(con, f"{shard_sql} ORDER BY {display_order}", path)
+                precompress(path, compress)
+                first, last = (
+                    con.execute(f"SELECT {key_list} FROM shard_rows WHERE __shard = {shard} ORDER BY {order} LIMIT 1").fetchone()
+                    for order in (display_order, shard_order)
+                )
+                entries[shard]["first"] = dict(zip(sort_columns, first))
+                entries[shard]["last"] = dict(zip(sort_columns, last))
+        elif changed:
+            cursor = con.execute(f"""
+                SELECT * EXCLUDE (__row_hash, __shard), __shard
+                FROM shard_rows
+                WHERE __shard IN ({", ".join(str(s) for s in changed)})
+                ORDER BY __shard, {display_order}
+            """)
+            columns = [d[0] for d in cursor.description][:-1]
+            for shard, records in iter_shards(cursor, columns, page_size):
+                write_json_atomic(out_dir / entries[shard]["file"], records, separators=(",", ":"))
+                precompress(out_dir / entries[shard]["file"], compress)
+                entries[shard]["first"] = {c: records[0][c] for c in sort_columns}
+                entries[shard]["last"] = {c: records[-1][c] for c in sort_columns}
+        con.execute("DROP TABLE shard_rows")
+
+        # Newest shard first; offsets are positions in display order
+        pages = []
+        total_rows = 0
+        for shard in sorted(entries, reverse=True):
+            entry = entries[shard]
+            entry.update(page=len(pages) + 1, offset=total_rows)
+            pages.append(entry)
+            total_rows += entry["rows"]
+
+        stale = [f for f in out_dir.glob("page-*.json") if f.name not in {p["file"] for p in pages}]
+        unchanged = len(pages) - len(changed)
+
+        if changed or stale or not previous or previous.get("total_rows") != total_rows:
+            status_column = SHARD_STATUS_COLUMN.get(table_name)
+            status_counts = {}
+            if status_column:
+                status_counts = dict(con.execute(
+                    f"SELECT {status_column}, COUNT(*) FROM {table_name} GROUP BY 1 ORDER BY 1"
+                ).fetchall())
+
+            write_json_atomic(out_dir / "index.json", {
+                "table": table_name,
+                "generated_at": datetime.now(),
+                "total_rows": total_rows,
+                "page_size": page_size,
+                "total_pages": len(pages),
+                "sort": [f"{column} {direction}" for column, direction in sort],
+                "status_column": status_column,
+                "status_counts": status_counts,
+                "pages": pages,
+            }, indent=2)
+
+        # Drop pages left over from a larger previous export
+        for f in stale:
+            remove_with_compressed(f)
+
+        print(f"  ✓ {table_name} → {out_dir.name}/ ({total_rows} records, {len(pages)} pages: "
+              f"{len(changed)} written, {unchanged} unchanged, {len(stale)} removed)")
+        return total_rows
+
+    except Exception as e:
+        print(f"  ✗ Error exporting {table_name}: {e}")
+        return 0
+
+
+def export_table_to_json(con, table_name: str, output_path: Path, engine: str = "duckdb", compress=()):
     """Export a DuckDB table to JSON file."""
     try:
         # Query all rows with limit
@@ -42,27 +311,73 @@ def export_table_to_json(con, table_name: str, output_path: Path):
             sort_clause = "ORDER BY created_at DESC"
             
         params = f"{sort_clause} LIMIT {limit_count}"
-        result = con.execute(f"SELECT * FROM {table_name} {params}").fetchdf()
-        
-        # Convert to list of dicts
-        records = result.to_dict(orient='records')
-        
-        # Write to JSON
-        with open(output_path, 'w', encoding='utf-8') as f:
-            json.dump(records, f, ensure_ascii=False, indent=2, default=json_serializer)
-        
-        print(f"  ✓ {table_name} → {output_path.name} ({len(records)} records)")
-        return len(records)
+        if engine == "duckdb":
+            count = copy_to_json(con, f"SELECT * FROM {table_name} {params}", output_path)
+        else:
+            result = con.execute(f"SELECT * FROM {table_name} {params}").fetchdf()
+
+            # Convert to list of dicts
+            records = result.to_dict(orient='records')
+
+            # Write to JSON
+            with open(output_path, 'w', encoding='utf-8') as f:
+                json.dump(records, f, ensure_ascii=False, indent=2, default=json_serializer)
+            count = len(records)
+        precompress(output_path, compress)
+
+        print(f"  ✓ {table_name} → {output_path.name} ({count} records)")
+        return count
         
     except Exception as e:
         print(f"  ✗ Error exporting {table_name}: {e}")
         return 0
 
 
+# Parquet artifacts: one file per main_gold table, sorted by the SHARD_SORT
+# keys (oldest first) so each row group covers a narrow date range and its
+# min/max statistics let readers skip row groups for range filters.
+PARQUET_SCHEMA = "main_gold"
+PARQUET_ROW_GROUP_SIZE = 50_000
+PARQUET_COMPRESSION = "zstd"
+
+
+def export_table_parquet(con, table_name: str, output_path: Path):
+    """Write a table to a Parquet file, replacing output_path atomically."""
+    try:
+        order = order_clause(SHARD_SORT.get(table_name, []), reverse=True)
+        sql = f"SELECT * FROM {table_name}" + (f" ORDER BY {order}" if order else "")
+        tmp = output_path.with_name(output_path.name + ".tmp")
+        posix = tmp.as_posix().replace("'", "''")
+        count = con.execute(f"""
+            COPY ({sql}) TO '{posix}'
+            (FORMAT PARQUET, COMPRESSION {PARQUET_COMPRESSION}, ROW_GROUP_SIZE {PARQUET_ROW_GROUP_SIZE})
+        """).fetchone()[0]
+        os.replace(tmp, output_path)
+
+        print(f"  ✓ {table_name} → {output_path.name} ({count} records, {output_path.stat().st_size:,} bytes)")
+        return count
+
+    except Exception as e:
+        print(f"  ✗ Error exporting {table_name}: {e}")
+        return 0
+
+
 def main():
     parser = argparse.ArgumentParser(description="Export Gold tables to JSON")
     parser.add_argument("--db", default="warehouse.duckdb", help="Path to DuckDB file")
     parser.add_argument("--out", default="web/src/lib", help="Output directory for JSON files")
+    parser.add_argument("--mode", choices=["legacy", "sharded", "parquet"], default="legacy",
+                        help="legacy: one capped JSON file per table; sharded: every row in page files + index.json; "
+                             "parquet: every main_gold table as a Parquet file")
+    parser.add_argument("--shard-out", default="web/public/data", help="Output directory for sharded exports")
+    parser.add_argument("--parquet-out", default="web/data/parquet", help="Output directory for Parquet artifacts")
+    parser.add_argument("--page-size", type=int, default=SHARD_PAGE_SIZE, help="Rows per shard page")
+    parser.add_argument("--delta", action="store_true",
+                        help="Sharded mode: rewrite only shards whose content hash changed since the last export")
+    parser.add_argument("--engine", choices=ENGINES, default="duckdb",
+                        help="duckdb: DuckDB writes the JSON (COPY ... FORMAT JSON); python: json.dump via pandas/rows")
+    parser.add_argument("--compress", default="",
+                        help="Comma-separated precompressed copies to write: gzip, brotli (needs the brotli package)")
     parser.add_argument(
         "--tables",
         default="gold_ledger,gold_exceptions,gold_invoices,gold_payments",
@@ -73,13 +388,25 @@ def main():
     db_path = Path(args.db)
     out_dir = Path(args.out)
     tables = [t.strip() for t in args.tables.split(",")]
+    compress = [c.strip() for c in args.compress.split(",") if c.strip()]
+    unknown = set(compress) - set(COMPRESSIONS)
+    if unknown:
+        print(f"Error: unknown compression(s): {', '.join(sorted(unknown))}")
+        return 1
+    if "brotli" in compress and brotli is None:
+        print("Warning: brotli is not installed (pip install brotli); skipping .br output")
+        compress.remove("brotli")
 
     if not db_path.exists():
         print(f"Error: DuckDB file not found: {db_path}")
         return 1
 
+    if args.mode == "sharded":
+        out_dir = Path(args.shard_out)
+    elif args.mode == "parquet":
+        out_dir = Path(args.parquet_out)
     out_dir.mkdir(parents=True, exist_ok=True)
-    
+
     print(f"Connecting to DuckDB: {db_path}", flush=True)
     con = duckdb.connect(str(db_path), read_only=True)
 
@@ -92,12 +419,37 @@ def main():
         "main_gold.gold_payments": "payments.json",
     }
 
+    if args.mode == "parquet":
+        tables = [row[0] for row in con.execute(
+            "SELECT table_name FROM information_schema.tables WHERE table_schema = ? ORDER BY 1",
+            [PARQUET_SCHEMA],
+        ).fetchall()]
+        print(f"\nExporting {len(tables)} table(s) to {out_dir}/", flush=True)
+        total_records = sum(
+            export_table_parquet(con, f"{PARQUET_SCHEMA}.{table}", out_dir / f"{table}.parquet") for table in tables
+        )
+        # Drop artifacts of tables that no longer exist
+        for f in out_dir.glob("*.parquet"):
+            if f.stem not in tables:
+                f.unlink()
+        con.close()
+
+        print(f"\nExport complete: {total_records} total records")
+        return 0
+
     print(f"\nExporting {len(table_mapping)} table(s) to {out_dir}/", flush=True)
     
     total_records = 0
     for table_name, json_filename in table_mapping.items():
-        output_path = out_dir / json_filename
-        count = export_table_to_json(con, table_name, output_path)
+        if args.mode == "sharded":
+            # orders.json -> <shard-out>/orders/
+            count = export_table_shards(
+                con, table_name, out_dir / Path(json_filename).stem, args.page_size, delta=args.delta,
+                engine=args.engine, compress=compress,
+            )
+        else:
+            output_path = out_dir / json_filename
+            count = export_table_to_json(con, table_name, output_path, args.engine, compress)
         total_records += count
 
     con.close()
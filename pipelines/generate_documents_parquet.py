@@ -7,9 +7,14 @@ Creates metadata for demo PDF files so stg_documents model can run.
 import pandas as pd
 from pathlib import Path
 
+from process_documents import CHUNK_COLUMNS, MANIFEST_FILE, chunk_pages
+from search_index import build_term_index
+
 # Output path
 OUTPUT_DIR = Path("data/raw")
 OUTPUT_FILE = OUTPUT_DIR / "documents_raw.parquet"
+CHUNKS_FILE = OUTPUT_DIR / "documents_chunks.parquet"
+TERMS_FILE = OUTPUT_DIR / "documents_terms.parquet"
 
 # Demo documents metadata (matching columns expected by dbt gold_documents.sql)
 # Expected columns: doc_id, filename, doc_type, content, created_at
@@ -86,5 +91,23 @@ def main():
     print(f"Columns: {list(df.columns)}")
     print(f"Saved to {OUTPUT_FILE}")
 
+    # Chunks for retrieval (each demo document is a single page)
+    chunks = pd.DataFrame(
+        [chunk for doc in DEMO_DOCUMENTS for chunk in chunk_pages(doc["doc_id"], [doc["content"]])],
+        columns=CHUNK_COLUMNS
+    )
+    terms, chunks["token_count"] = build_term_index(chunks)
+    chunks.to_parquet(CHUNKS_FILE, index=False)
+    terms.to_parquet(TERMS_FILE, index=False)
+    print(f"Saved {len(chunks)} chunks to {CHUNKS_FILE}")
+    print(f"Saved {len(terms)} index entries to {TERMS_FILE}")
+
+    # The parquet no longer holds what process_documents.py extracted, so its
+    # manifest (per-PDF hashes over these files) must not be trusted for an
+    # incremental run
+    if MANIFEST_FILE.exists():
+        MANIFEST_FILE.unlink()
+        print(f"Removed {MANIFEST_FILE}; the next process_documents.py run re-parses every PDF.")
+
 if __name__ == "__main__":
     main()
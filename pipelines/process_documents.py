@@ -1,73 +1,208 @@
 import os
+import argparse
+import hashlib
+import json
+import re
 import pandas as pd
 from pypdf import PdfReader
 from pathlib import Path
 from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+
+from search_index import build_term_index
 
 # Configuration
 DOCS_DIR = Path("data/documents")
 OUTPUT_FILE = Path("data/raw/documents_raw.parquet")
+CHUNKS_FILE = Path("data/raw/documents_chunks.parquet")
+# Inverted index over CHUNKS_FILE (see search_index.py)
+TERMS_FILE = Path("data/raw/documents_terms.parquet")
+# Content hashes of the PDFs behind OUTPUT_FILE, used to skip unchanged files
+MANIFEST_FILE = Path("data/raw/documents_manifest.json")
+
+# Retrieval chunks: at most CHUNK_SIZE characters, never spanning pages,
+# and a new chunk starts at every section heading (第N条 / Article N).
+CHUNK_SIZE = 400
+CHUNK_COLUMNS = ["doc_id", "page", "chunk_no", "char_start", "char_end", "text"]
+SECTION_HEADING = re.compile(r"^\s*(第[0-9０-９一二三四五六七八九十百]+条|(Article|Section)\s+\d+)", re.IGNORECASE)
 
-def extract_text_from_pdf(pdf_path):
+def extract_pages_from_pdf(pdf_path):
     try:
         reader = PdfReader(pdf_path)
-        text = ""
-        for page in reader.pages:
-            text += page.extract_text() + "\n"
-        return text
+        return [page.extract_text() or "" for page in reader.pages]
     except Exception as e:
         print(f"Error extracting text from {pdf_path}: {e}")
-        return ""
+        return []
+
+def join_pages(pages):
+    """Full document text as stored in documents_raw.content."""
+    return "".join(page + "\n" for page in pages)
+
+def _page_pieces(text, chunk_size):
+    """
+    Split one page into (start, end, is_heading) spans no longer than
+    chunk_size: whole lines, with over-long lines cut into fixed windows.
+    """
+    for match in re.finditer(r"[^\n]*\n?", text):
+        start, end = match.span()
+        if start == end:
+            continue
+        is_heading = bool(SECTION_HEADING.match(match.group()))
+        for piece_start in range(start, end, chunk_size):
+            yield piece_start, min(piece_start + chunk_size, end), is_heading and piece_start == start
+
+def chunk_pages(doc_id, pages, chunk_size=CHUNK_SIZE):
+    """
+    Chunk a document's pages for retrieval. char_start/char_end are offsets
+    into join_pages(pages), so a chunk can be traced back to the full text.
+    """
+    chunks = []
+
+    def flush(page_no, offset, page_text, start, end):
+        text = page_text[start:end]
+        stripped = text.strip()
+        if not stripped:
+            return
+        lead = len(text) - len(text.lstrip())
+        chunks.append({
+            "doc_id": doc_id,
+            "page": page_no,
+            "chunk_no": len(chunks) + 1,
+            "char_start": offset + start + lead,
+            "char_end": offset + start + lead + len(stripped),
+            "text": stripped,
+        })
+
+    offset = 0
+    for page_no, page_text in enumerate(pages, start=1):
+        current = None
+        for start, end, is_heading in _page_pieces(page_text, chunk_size):
+            if current is None:
+                current = [start, end]
+            elif is_heading or end - current[0] > chunk_size:
+                flush(page_no, offset, page_text, *current)
+                current = [start, end]
+            else:
+                current[1] = end
+        if current is not None:
+            flush(page_no, offset, page_text, *current)
+        offset += len(page_text) + 1
+
+    return chunks
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def doc_type_from_stem(stem):
+    # Metadata logic (naive parsing from filename)
+    # DOC-YYYYMM-[TYPE]-[SEQ].pdf
+    parts = stem.split("-")
+    doc_type = "unknown"
+    if len(parts) >= 3:
+        type_code = parts[2]
+        if type_code == "C": doc_type = "contract"
+        elif type_code == "PO": doc_type = "po"
+        elif type_code == "INV": doc_type = "invoice"
+        elif type_code == "POL": doc_type = "policy"
+    return doc_type
+
+def build_record(pdf_file):
+    """
+    Extract one PDF into a documents_raw record and its chunks.
+    Runs in worker processes.
+    """
+    print(f"Processing {pdf_file.name}...", flush=True)
+
+    pages = extract_pages_from_pdf(pdf_file)
 
-def process_documents():
+    record = {
+        "doc_id": pdf_file.stem,
+        "filename": pdf_file.name,
+        "doc_type": doc_type_from_stem(pdf_file.stem),
+        "content": join_pages(pages),
+        "created_at": datetime.now(),
+        "file_size": pdf_file.stat().st_size
+    }
+    return record, chunk_pages(pdf_file.stem, pages)
+
+def load_manifest():
+    if not (MANIFEST_FILE.exists() and OUTPUT_FILE.exists() and CHUNKS_FILE.exists()):
+        return {}
+    with open(MANIFEST_FILE, encoding="utf-8") as f:
+        return json.load(f)
+
+def process_documents(workers=None, full=False):
+    """
+    Extract text from every PDF in DOCS_DIR into OUTPUT_FILE, and its
+    page-level chunks into CHUNKS_FILE.
+    Only files whose content hash differs from the manifest are parsed
+    (in a process pool); unchanged rows are carried over from the existing
+    parquet and rows for deleted PDFs are dropped. full=True re-parses all.
+    """
     if not DOCS_DIR.exists():
         print(f"Documents directory {DOCS_DIR} does not exist.")
         return
 
-    records = []
-    
-    for pdf_file in DOCS_DIR.glob("*.pdf"):
-        print(f"Processing {pdf_file.name}...")
-        
-        # Simple chunking: Treat entire file as one chunk for this MVP
-        # Or split by blank lines if we really wanted to.
-        # For simplicity in MVP RAG, let's keep it document-level or page-level.
-        # Spec says "chunking", let's do simple naive text chunking.
-        
-        full_text = extract_text_from_pdf(pdf_file)
-        
-        # Metadata logic (naive parsing from filename)
-        # DOC-YYYYMM-[TYPE]-[SEQ].pdf
-        parts = pdf_file.stem.split("-")
-        doc_type = "unknown"
-        if len(parts) >= 3:
-            type_code = parts[2]
-            if type_code == "C": doc_type = "contract"
-            elif type_code == "PO": doc_type = "po"
-            elif type_code == "INV": doc_type = "invoice"
-            elif type_code == "POL": doc_type = "policy"
-            
-        # Create a record
-        records.append({
-            "doc_id": pdf_file.stem,
-            "filename": pdf_file.name,
-            "doc_type": doc_type,
-            "content": full_text,
-            "created_at": datetime.now(),
-            "file_size": pdf_file.stat().st_size
-        })
-        
-    if not records:
+    pdf_files = sorted(DOCS_DIR.glob("*.pdf"))
+    if not pdf_files:
         print("No documents found to process.")
         return
 
-    df = pd.DataFrame(records)
-    
+    manifest = {} if full else load_manifest()
+    hashes = {pdf_file.name: file_sha256(pdf_file) for pdf_file in pdf_files}
+    changed = [f for f in pdf_files if manifest.get(f.name) != hashes[f.name]]
+    removed = set(manifest) - set(hashes)
+
+    print(f"{len(changed)} new/modified, {len(pdf_files) - len(changed)} unchanged, {len(removed)} removed")
+    if not changed and not removed:
+        print(f"{OUTPUT_FILE} is up to date.")
+        return
+
+    if workers == 1 or len(changed) == 1:
+        results = [build_record(f) for f in changed]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(build_record, changed))
+
+    df = pd.DataFrame([record for record, _ in results])
+    chunks = pd.DataFrame(
+        [chunk for _, doc_chunks in results for chunk in doc_chunks], columns=CHUNK_COLUMNS
+    )
+
+    # Merge: keep previously extracted rows for files that are still present and unchanged
+    if manifest:
+        keep = {f.stem for f in pdf_files} - {f.stem for f in changed}
+        previous = pd.read_parquet(OUTPUT_FILE)
+        df = pd.concat([previous[previous["doc_id"].isin(keep)], df], ignore_index=True)
+        previous_chunks = pd.read_parquet(CHUNKS_FILE, columns=CHUNK_COLUMNS)
+        chunks = pd.concat([previous_chunks[previous_chunks["doc_id"].isin(keep)], chunks], ignore_index=True)
+
+    df = df.sort_values("doc_id", ignore_index=True)
+    chunks = chunks.sort_values(["doc_id", "chunk_no"], ignore_index=True)
+
+    # Tokenizing is cheap next to PDF parsing, so the index is rebuilt from all chunks
+    terms, chunks["token_count"] = build_term_index(chunks)
+
     # Ensure raw directory exists
     os.makedirs(OUTPUT_FILE.parent, exist_ok=True)
-    
+
     df.to_parquet(OUTPUT_FILE, index=False)
+    chunks.to_parquet(CHUNKS_FILE, index=False)
+    terms.to_parquet(TERMS_FILE, index=False)
+    with open(MANIFEST_FILE, "w", encoding="utf-8") as f:
+        json.dump(hashes, f, indent=2, sort_keys=True)
     print(f"Saved {len(df)} documents to {OUTPUT_FILE}")
+    print(f"Saved {len(chunks)} chunks to {CHUNKS_FILE}")
+    print(f"Saved {len(terms)} index entries to {TERMS_FILE}")
 
 if __name__ == "__main__":
-    process_documents()
+    parser = argparse.ArgumentParser(description="Extract PDF text into documents_raw/documents_chunks parquet")
+    parser.add_argument("--workers", type=int, default=None, help="Extraction processes (default: CPU count)")
+    parser.add_argument("--full", action="store_true", help="Ignore the manifest and re-parse every PDF")
+    args = parser.parse_args()
+
+    process_documents(workers=args.workers, full=args.full)
@@ -0,0 +1,55 @@
+"""
+search_index.py
+Tokenizer and inverted index for document chunk retrieval.
+
+The same tokenize() is used at pipeline time (to build documents_terms.parquet)
+and at query time by web/src/lib/query_duckdb.py, so both sides agree on terms.
+"""
+import re
+import unicodedata
+from collections import Counter
+
+import pandas as pd
+
+# Runs of ASCII letters/digits, or of Japanese script (kana, kanji)
+_TOKEN_RUN = re.compile(r"[0-9a-z]+|[\u3040-\u30ff\u3400-\u9fff]+")
+
+TERM_COLUMNS = ["term", "chunk_id", "doc_id", "tf"]
+
+
+def tokenize(text):
+    """
+    Split text into index terms.
+    English/numbers become lower-cased words; Japanese has no word boundaries,
+    so each run of Japanese characters becomes overlapping character bigrams
+    (a single-character run is kept as is). Text is NFKC-normalized first so
+    full-width and half-width forms match.
+    """
+    text = unicodedata.normalize("NFKC", text or "").lower()
+    terms = []
+    for run in _TOKEN_RUN.findall(text):
+        if run.isascii() or len(run) == 1:
+            terms.append(run)
+        else:
+            terms.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return terms
+
+
+def build_term_index(chunks):
+    """
+    Build the inverted index for a documents_chunks DataFrame.
+    Returns (terms, token_counts): one row per (term, chunk) with its term
+    frequency, and the token count of every chunk in chunks order (the
+    document length BM25 normalizes by).
+    """
+    rows = []
+    token_counts = []
+    for chunk in chunks.itertuples(index=False):
+        terms = tokenize(chunk.text)
+        token_counts.append(len(terms))
+        chunk_id = f"{chunk.doc_id}#{chunk.chunk_no}"
+        for term, tf in Counter(terms).items():
+            rows.append((term, chunk_id, chunk.doc_id, tf))
+
+    terms = pd.DataFrame(rows, columns=TERM_COLUMNS).sort_values(["term", "chunk_id"], ignore_index=True)
+    return terms, token_counts
@@ -2,17 +2,329 @@
 """
 update_warehouse.py
 Load raw data into DuckDB bronze schema with deduplication.
+Every raw source in SOURCES is merged into its bronze table incrementally
+(see merge_into); sources whose files are unchanged since the last load
+are skipped.
+
+Each run that changes the warehouse gets a generation id. Every loaded file
+is recorded against it in bronze._load_manifest, rows written by the run
+carry it in load_generation, and the current id is published next to the
+database file (see GENERATION_SUFFIX) for caches and exports.
 """
 import argparse
+import hashlib
+import sys
+import time
 import duckdb
 from pathlib import Path
 from datetime import datetime
 
 
+# Raw inputs (relative to --data-dir) and the bronze table each is merged into.
+#   key:      dedup / merge key (one row per key is kept)
+#   order_by: which duplicate wins (latest first); None if duplicates are not expected
+#   snapshot: the files hold the full current state, so keys missing from
+#             them are deleted from the table (bids only cover recent years)
+SOURCES = {
+    "bids": {
+        "path": "bids/*/*/*.parquet",
+        "table": "bronze.bids",
+        "key": ["sequence_no"],
+        "order_by": "snapshot_date",
+        "snapshot": False,
+    },
+    "corporate": {
+        "path": "corporate_raw.parquet",
+        "table": "bronze.corporate",
+        "key": ["corporate_number"],
+        "order_by": "snapshot_date",
+        "snapshot": True,
+    },
+    "documents": {
+        "path": "documents_raw.parquet",
+        "table": "bronze.documents",
+        "key": ["doc_id"],
+        "order_by": "created_at",
+        "snapshot": True,
+    },
+    "document_chunks": {
+        "path": "documents_chunks.parquet",
+        "table": "bronze.document_chunks",
+        "key": ["doc_id", "chunk_no"],
+        "order_by": None,
+        "snapshot": True,
+    },
+    "document_terms": {
+        "path": "documents_terms.parquet",
+        "table": "bronze.document_terms",
+        "key": ["term", "chunk_id"],
+        "order_by": None,
+        "snapshot": True,
+    },
+}
+
+# Columns that change on every load without the record changing; excluded from row_hash
+VOLATILE_COLUMNS = {"ingested_at", "snapshot_date", "created_at", "load_generation"}
+
+# Sidecar file holding the current generation id: warehouse.duckdb.generation
+GENERATION_SUFFIX = ".generation"
+
+
+def quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def quote_literal(value):
+    return "NULL" if value is None else "'" + str(value).replace("'", "''") + "'"
+
+
+def with_transaction(con, fn):
+    con.execute("BEGIN TRANSACTION")
+    try:
+        result = fn()
+    except Exception:
+        con.execute("ROLLBACK")
+        raise
+    con.execute("COMMIT")
+    return result
+
+
+def table_columns(con, table):
+    return [row[0] for row in con.execute(f"DESCRIBE {table}").fetchall()]
+
+
+def table_exists(con, table):
+    schema, name = table.split(".")
+    return con.execute(
+        "SELECT COUNT(*) FROM information_schema.tables WHERE table_schema = ? AND table_name = ?",
+        [schema, name],
+    ).fetchone()[0] > 0
+
+
+def source_files(data_dir, source):
+    return sorted(data_dir.glob(source["path"]))
+
+
+def read_relation(files, data_dir):
+    """DuckDB table function scanning all of a source's files in one (parallel) read."""
+    paths = ", ".join("'" + f.as_posix().replace("'", "''") + "'" for f in files)
+    if files[0].suffix == ".csv":
+        return f"read_csv_auto([{paths}], ignore_errors=true)"
+    # Partition directories (key=value) become columns
+    hive = any("=" in part for f in files for part in f.relative_to(data_dir).parts[:-1])
+    return f"read_parquet([{paths}], hive_partitioning={str(hive).lower()})"
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def file_row_counts(con, files):
+    """Rows per file; read from the Parquet footers, so the data is not scanned."""
+    paths = [f.as_posix() for f in files]
+    if files[0].suffix == ".csv":
+        return {p: con.execute("SELECT COUNT(*) FROM read_csv_auto(?, ignore_errors=true)", [p]).fetchone()[0]
+                for p in paths}
+    rows = con.execute(
+        "SELECT file_name, num_rows FROM parquet_file_metadata(?)", [paths]
+    ).fetchall()
+    return dict(rows)
+
+
+def ensure_metadata_tables(con):
+    con.execute("""
+        CREATE TABLE IF NOT EXISTS bronze._merge_log (
+            merged_at TIMESTAMP, target_table VARCHAR, mode VARCHAR,
+            inserted BIGINT, updated BIGINT, unchanged BIGINT
+        )
+    """)
+    # One row per loaded file per generation
+    con.execute("""
+        CREATE TABLE IF NOT EXISTS bronze._load_manifest (
+            generation_id VARCHAR, source VARCHAR, target_table VARCHAR,
+            file_path VARCHAR, file_size BIGINT, file_hash VARCHAR,
+            row_count BIGINT, load_seconds DOUBLE, loaded_at TIMESTAMP
+        )
+    """)
+    # Tables from before the per-file layout are replaced
+    if "generation_id" not in table_columns(con, "bronze._load_manifest"):
+        con.execute("DROP TABLE bronze._load_manifest")
+        ensure_metadata_tables(con)
+
+
+def last_loaded_files(con, source):
+    """{file_path: file_hash} of the source's most recent load."""
+    rows = con.execute("""
+        SELECT file_path, file_hash FROM bronze._load_manifest
+        WHERE source = ?
+          AND generation_id = (SELECT max(generation_id) FROM bronze._load_manifest WHERE source = ?)
+    """, [source, source]).fetchall()
+    return dict(rows)
+
+
+def current_generation(con):
+    if not table_exists(con, "bronze._load_manifest"):
+        return None
+    return con.execute("SELECT max(generation_id) FROM bronze._load_manifest").fetchone()[0]
+
+
+def publish_generation(db_path, generation_id):
+    """Write the generation id next to the database so readers can check it without opening it."""
+    sidecar = Path(str(db_path) + GENERATION_SUFFIX)
+    tmp = sidecar.with_name(sidecar.name + ".tmp")
+    tmp.write_text(generation_id + "\n", encoding="utf-8")
+    tmp.replace(sidecar)
+
+
+def merge_into(con, relation, target, key, order_by=None, mode="incremental", snapshot=False,
+               ingested_at=None, generation_id=None):
+    """
+    Upsert the rows of `relation` (a table or table function) into target,
+    keyed on the `key` columns.
+    Incoming rows are first deduplicated per key (latest `order_by` wins) and
+    stamped with row_hash, a hash of the non-volatile columns, and with
+    generation_id as load_generation. In incremental mode new keys are
+    inserted, keys whose row_hash changed are updated and everything else
+    is left untouched (keeping its load_generation), so the write cost
+    follows the delta.
+    With snapshot=True, keys absent from the incoming rows are deleted.
+    mode="full" (or a missing/differently shaped target) rebuilds target.
+    Returns (inserted, updated, unchanged) and logs it to bronze._merge_log.
+    """
+    columns = table_columns(con, f"(SELECT * FROM {relation})")
+    hashed = [c for c in columns if c not in VOLATILE_COLUMNS]
+    row_hash = "md5(to_json(struct_pack(" + ", ".join(f"{quote(c)} := {quote(c)}" for c in hashed) + ")))"
+    keys = ", ".join(quote(k) for k in key)
+    on = " AND ".join(f"t.{quote(k)} = i.{quote(k)}" for k in key)
+    stamp = "" if "ingested_at" in columns else f", '{(ingested_at or datetime.now()).isoformat()}' AS ingested_at"
+    stamp += f", {quote_literal(generation_id)} AS load_generation"
+
+    con.execute(f"""
+        CREATE OR REPLACE TEMP TABLE merge_incoming AS
+        SELECT * EXCLUDE (rn)
+        FROM (
+            SELECT *{stamp},
+                {row_hash} AS row_hash,
+                ROW_NUMBER() OVER (
+                    PARTITION BY {keys}
+                    ORDER BY {quote(order_by) + " DESC" if order_by else keys}
+                ) AS rn
+            FROM {relation}
+        )
+        WHERE rn = 1
+    """)
+    incoming = con.execute("SELECT COUNT(*) FROM merge_incoming").fetchone()[0]
+    merged_columns = table_columns(con, "merge_incoming")
+
+    exists = table_exists(con, target)
+    if mode == "incremental" and exists and table_columns(con, target) != merged_columns:
+        print(f"  Columns of {target} changed; rebuilding")
+        mode = "full"
+    elif mode == "incremental" and not exists:
+        mode = "full"
+
+    deleted = 0
+    if mode == "full":
+        con.execute(f"CREATE OR REPLACE TABLE {target} AS SELECT * FROM merge_incoming")
+        inserted, updated, unchanged = incoming, 0, 0
+    else:
+        inserted, updated = con.execute(f"""
+            SELECT
+                COUNT(*) FILTER (WHERE t.row_hash IS NULL),
+                COUNT(*) FILTER (WHERE t.row_hash <> i.row_hash)
+            FROM merge_incoming i
+            LEFT JOIN {target} t ON {on}
+        """).fetchone()
+        unchanged = incoming - inserted - updated
+
+        if updated:
+            assignments = ", ".join(f"{quote(c)} = i.{quote(c)}" for c in merged_columns if c not in key)
+            con.execute(f"""
+                UPDATE {target} AS t
+                SET {assignments}
+                FROM merge_incoming i
+                WHERE {on} AND t.row_hash <> i.row_hash
+            """)
+        if inserted:
+            con.execute(f"""
+                INSERT INTO {target}
+                SELECT i.* FROM merge_incoming i
+                ANTI JOIN {target} t ON {on}
+            """)
+        if snapshot:
+            deleted = con.execute(f"""
+                DELETE FROM {target} t
+                WHERE NOT EXISTS (SELECT 1 FROM merge_incoming i WHERE {on})
+            """).fetchone()[0]
+
+    con.execute(
+        "INSERT INTO bronze._merge_log VALUES (current_timestamp, ?, ?, ?, ?, ?)",
+        [target, mode, inserted, updated, unchanged],
+    )
+    con.execute("DROP TABLE merge_incoming")
+
+    print(f"  {target} ({mode}): {inserted} inserted, {updated} updated, {unchanged} unchanged"
+          + (f", {deleted} deleted" if deleted else ""))
+    return inserted, updated, unchanged
+
+
+def load_sources(con, data_dir, mode="incremental"):
+    """
+    Merge every registered source into its bronze table in one transaction,
+    so a failed load leaves the warehouse as it was.
+    Returns the new generation id, or None if every source was unchanged.
+    """
+    loaded_at = datetime.now()
+    generation_id = loaded_at.strftime("%Y%m%dT%H%M%S.%f")
+    ensure_metadata_tables(con)
+
+    def load():
+        changed = False
+        for name, source in SOURCES.items():
+            files = source_files(data_dir, source)
+            if not files:
+                print(f"{name}: no files matching {source['path']}; skipped")
+                continue
+
+            hashes = {f.as_posix(): file_sha256(f) for f in files}
+            if mode == "incremental" and table_exists(con, source["table"]) and hashes == last_loaded_files(con, name):
+                print(f"{name}: unchanged since last load ({len(files)} file(s)); skipped")
+                continue
+
+            print(f"{name}: loading {len(files)} file(s)")
+            started = time.perf_counter()
+            merge_into(
+                con, read_relation(files, data_dir), source["table"], source["key"],
+                order_by=source["order_by"], mode=mode, snapshot=source["snapshot"],
+                ingested_at=loaded_at, generation_id=generation_id,
+            )
+            load_seconds = time.perf_counter() - started
+
+            row_counts = file_row_counts(con, files)
+            con.executemany(
+                "INSERT INTO bronze._load_manifest VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    [generation_id, name, source["table"], path, Path(path).stat().st_size,
+                     file_hash, row_counts.get(path), load_seconds, loaded_at]
+                    for path, file_hash in hashes.items()
+                ],
+            )
+            changed = True
+        return generation_id if changed else None
+
+    return with_transaction(con, load)
+
+
 def main():
     parser = argparse.ArgumentParser(description="Update DuckDB warehouse with raw data")
     parser.add_argument("--db", default="warehouse.duckdb", help="Path to DuckDB file")
     parser.add_argument("--data-dir", default="data/raw", help="Directory containing raw data files")
+    parser.add_argument("--mode", choices=["incremental", "full"], default="incremental",
+                        help="incremental: upsert changed rows by row hash; full: rebuild bronze tables")
     args = parser.parse_args()
 
     db_path = Path(args.db)
@@ -24,81 +336,26 @@ def main():
     # Create bronze schema if not exists
     con.execute("CREATE SCHEMA IF NOT EXISTS bronze;")
 
-    # Find parquet files
-    parquet_files = list(data_dir.glob("*.parquet"))
-    csv_files = list(data_dir.glob("*.csv"))
-    
-    data_files = parquet_files + csv_files
-    
-    if not data_files:
-        print(f"No data files found in {data_dir}")
-        con.close()
-        return
-
-    print(f"Found {len(data_files)} data file(s)")
-
-    for data_file in data_files:
-        print(f"Processing: {data_file.name}")
-        
-        # Determine read function based on extension
-        if data_file.suffix == ".parquet":
-            read_func = f"read_parquet('{data_file}')"
-        else:
-            read_func = f"read_csv_auto('{data_file}', ignore_errors=true)"
-
-        # Create staging table
-        staging_table = f"bronze.staging_{data_file.stem}"
-        
-        try:
-            # Load into staging
-            con.execute(f"""
-                CREATE OR REPLACE TABLE {staging_table} AS
-                SELECT *, '{datetime.now().isoformat()}' as ingested_at
-                FROM {read_func}
-            """)
-            
-            row_count = con.execute(f"SELECT COUNT(*) FROM {staging_table}").fetchone()[0]
-            print(f"  Loaded {row_count} rows into {staging_table}")
-            
-        except Exception as e:
-            print(f"  Error loading {data_file.name}: {e}")
-
-    # Create main bronze.bids table with deduplication
+    # Staging tables from the previous one-table-per-file loader are no longer used
+    for (table,) in con.execute("""
+        SELECT table_name FROM information_schema.tables
+        WHERE table_schema = 'bronze' AND table_name LIKE 'staging_%'
+    """).fetchall():
+        con.execute(f"DROP TABLE bronze.{quote(table)}")
+
     try:
-        # Check if staging table exists
-        staging_tables = con.execute("""
-            SELECT table_name FROM information_schema.tables 
-            WHERE table_schema = 'bronze' AND table_name LIKE 'staging_%'
-        """).fetchall()
-        
-        if staging_tables:
-            # Get first staging table as base
-            first_staging = f"bronze.{staging_tables[0][0]}"
-            
-            con.execute(f"""
-                CREATE OR REPLACE TABLE bronze.bids AS
-                SELECT *
-                FROM (
-                    SELECT *,
-                        ROW_NUMBER() OVER (
-                            PARTITION BY sequence_no
-                            ORDER BY ingested_at DESC
-                        ) as rn
-                    FROM {first_staging}
-                )
-                WHERE rn = 1
-            """)
-            
-            # Drop the rn column
-            con.execute("ALTER TABLE bronze.bids DROP COLUMN rn")
-            
-            final_count = con.execute("SELECT COUNT(*) FROM bronze.bids").fetchone()[0]
-            print(f"\nCreated bronze.bids with {final_count} unique records (deduplicated by sequence_no)")
-            
+        generation_id = load_sources(con, data_dir, args.mode)
     except Exception as e:
-        print(f"Error creating bronze.bids: {e}")
+        print(f"Error loading warehouse (no changes committed): {e}")
+        con.close()
+        sys.exit(1)
 
+    generation_id = generation_id or current_generation(con)
     con.close()
+
+    if generation_id:
+        publish_generation(db_path, generation_id)
+        print(f"\nWarehouse generation: {generation_id}")
     print("\nDone!")
 
 
@@ -0,0 +1,94 @@
+import csv
+import hashlib
+import io
+import sys
+import threading
+import urllib.parse
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+
+# The pipeline scripts are run as plain scripts, not installed as a package
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "pipelines"))
+
+
+class BidsPortal:
+    """
+    Offline stand-in for the procurement portal's download endpoint
+    (?fileversion=v001&filename=successful_bid_record_info_all_YYYY.zip).
+    Serves published ZIPs with an ETag, answers If-None-Match with 304, and
+    returns `errors[filename]` as the status for files set to fail.
+    """
+
+    def __init__(self):
+        self.files = {}
+        self.errors = {}
+        self.requests = []
+        self.url = None
+
+    def publish(self, year, rows):
+        """Publish a year as a ZIP holding one headerless CSV of `rows`."""
+        text = io.StringIO()
+        csv.writer(text).writerows(rows)
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w") as z:
+            z.writestr(f"successful_bid_record_info_all_{year}.csv", text.getvalue())
+        body = buffer.getvalue()
+        self.files[f"successful_bid_record_info_all_{year}.zip"] = (body, f'"{hashlib.md5(body).hexdigest()}"')
+
+    def fail(self, year, status):
+        self.errors[f"successful_bid_record_info_all_{year}.zip"] = status
+
+    def handler(self):
+        portal = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                query = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
+                filename = query.get("filename", [""])[0]
+                portal.requests.append((filename, self.headers.get("If-None-Match")))
+
+                if filename in portal.errors:
+                    self.send_error(portal.errors[filename])
+                    return
+                if filename not in portal.files:
+                    self.send_error(404)
+                    return
+                body, etag = portal.files[filename]
+                if self.headers.get("If-None-Match") == etag:
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header("ETag", etag)
+                self.send_header("Content-Type", "application/zip")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+@pytest.fixture
+def bids_portal():
+    portal = BidsPortal()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), portal.handler())
+    portal.url = f"http://127.0.0.1:{server.server_address[1]}/download"
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield portal
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """Run in an empty directory; the pipelines write to relative data/ paths."""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
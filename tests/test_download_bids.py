@@ -0,0 +1,74 @@
+import duckdb
+
+import download_bids
+
+
+def bid_rows(year, count, amount=1000):
+    # sequence_no, name, date, amount, organization, (unused), contractor, corporate number
+    return [
+        [f"{year}{i:04d}", f"案件{i}", f"{year}-04-{i % 28 + 1:02d}", amount, "org", "", "contractor", "1234567890123"]
+        for i in range(count)
+    ]
+
+
+def rows_by_year():
+    return dict(duckdb.sql(f"""
+        SELECT contract_year, COUNT(*)
+        FROM read_parquet('{(download_bids.OUTPUT_DIR / "*" / "*" / "*.parquet").as_posix()}', hive_partitioning = true)
+        GROUP BY 1
+    """).fetchall())
+
+
+def test_downloads_every_year_and_builds_the_dataset(workdir, bids_portal):
+    bids_portal.publish(2024, bid_rows(2024, 3))
+    bids_portal.publish(2025, bid_rows(2025, 5))
+
+    download_bids.download_and_process([2025, 2024], base_url=bids_portal.url)
+
+    assert rows_by_year() == {2024: 3, 2025: 5}
+    index = download_bids.load_cache_index()
+    assert index[download_bids.zip_filename(2025)]["etag"] == bids_portal.files[download_bids.zip_filename(2025)][1]
+
+
+def test_unchanged_years_are_revalidated_with_304(workdir, bids_portal):
+    bids_portal.publish(2025, bid_rows(2025, 5))
+    download_bids.download_and_process([2025], base_url=bids_portal.url)
+    output = sorted(download_bids.OUTPUT_DIR.rglob("*.parquet"))
+    mtimes = [p.stat().st_mtime_ns for p in output]
+
+    status, _ = download_bids.fetch_year(
+        2025, download_bids.load_cache_index()[download_bids.zip_filename(2025)], bids_portal.url
+    )
+    assert status == "unchanged"
+
+    download_bids.download_and_process([2025], base_url=bids_portal.url)
+    # Conditional GET sent, nothing rebuilt
+    assert bids_portal.requests[-1] == (download_bids.zip_filename(2025), bids_portal.files[download_bids.zip_filename(2025)][1])
+    assert [p.stat().st_mtime_ns for p in sorted(download_bids.OUTPUT_DIR.rglob("*.parquet"))] == mtimes
+
+
+def test_failed_year_falls_back_to_the_cached_zip(workdir, bids_portal):
+    bids_portal.publish(2024, bid_rows(2024, 3))
+    bids_portal.publish(2025, bid_rows(2025, 5))
+    download_bids.download_and_process([2025, 2024], base_url=bids_portal.url)
+
+    # 2025 now errors while 2024 changes, forcing a rebuild
+    bids_portal.fail(2025, 500)
+    bids_portal.publish(2024, bid_rows(2024, 4))
+    download_bids.download_and_process([2025, 2024], base_url=bids_portal.url)
+
+    assert rows_by_year() == {2024: 4, 2025: 5}
+    # The stale year keeps its last good cache entry
+    index = download_bids.load_cache_index()
+    assert index[download_bids.zip_filename(2025)]["etag"] == bids_portal.files[download_bids.zip_filename(2025)][1]
+
+
+def test_failed_year_without_cache_is_skipped(workdir, bids_portal):
+    bids_portal.publish(2024, bid_rows(2024, 3))
+    bids_portal.fail(2025, 404)
+
+    status, meta = download_bids.fetch_year(2025, None, bids_portal.url)
+    assert (status, meta) == ("failed", None)
+
+    download_bids.download_and_process([2025, 2024], base_url=bids_portal.url)
+    assert rows_by_year() == {2024: 3}
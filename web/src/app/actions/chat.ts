@@ -1,6 +1,6 @@
 'use server';
 
-import { query } from '@/lib/db';
+import { searchDocuments } from '@/lib/db';
 import OpenAI from 'openai';
 
 // Initialize OpenAI client
@@ -121,51 +121,10 @@ export async function chatDetail(messages: ChatMessage[]): Promise<ChatResponse>
   }
 
   try {
-    // 1. Retrieval - Improved for Japanese/English bilingual support
-    // Japanese text has no spaces, so we need different tokenization
-    const isJapanese = /[\u3040-\u309F\u30A0-\u30FF\u4E00-\u9FAF]/.test(userQuery);
-    
-    let sql = `SELECT doc_id, filename, content FROM main_gold.gold_documents WHERE 1=1 `;
-    const params: any[] = [];
-    
-    if (isJapanese) {
-        // For Japanese: Split by common particles (の, を, は, が, に, で, と, も, や, か, て) and punctuation
-        // This creates meaningful search terms from natural language queries
-        const jpKeywords = userQuery
-            .replace(/[？！。、「」『』（）・\s]/g, ' ')  // Punctuation → space
-            .replace(/[のをはがにでともやかてより]/g, ' ')  // Common particles → space
-            .split(/\s+/)
-            .filter(w => w.length >= 2);  // Keep tokens 2+ chars
-        
-        if (jpKeywords.length > 0) {
-            sql += "AND (";
-            const conditions = jpKeywords.map(() => `content ILIKE ?`);
-            // Also add the full query as a fallback match
-            conditions.push(`content ILIKE ?`);
-            sql += conditions.join(" OR ");
-            sql += ")";
-            jpKeywords.forEach(k => params.push(`%${k}%`));
-            params.push(`%${userQuery.replace(/[？！。、\s]/g, '')}%`);  // Full query stripped
-        } else {
-            // Fallback: search with the entire query if no keywords extracted
-            sql += "AND content ILIKE ?";
-            params.push(`%${userQuery}%`);
-        }
-    } else {
-        // English: standard space-based tokenization  
-        const keywords = userQuery.split(' ').filter(w => w.length > 2);
-        if (keywords.length > 0) {
-            sql += "AND (";
-            const conditions = keywords.map(() => `content ILIKE ?`);
-            sql += conditions.join(" OR ");
-            sql += ")";
-            keywords.forEach(k => params.push(`%${k}%`));
-        }
-    }
-    
-    sql += " LIMIT 5";
-    
-    const docs = await query(sql, params) as { doc_id: string, filename: string, content: string }[];
+    // 1. Retrieval - BM25-ranked lookup over the inverted index of document
+    // chunks (Japanese bigrams / English words), built at pipeline time.
+    // Chunks are small and carry real page numbers for citations.
+    const docs = await searchDocuments(userQuery, 5);
 
     // --- SHORT-CIRCUIT: No Ops if 0 docs found ---
     if (docs.length === 0) {
@@ -176,9 +135,9 @@ export async function chatDetail(messages: ChatMessage[]): Promise<ChatResponse>
     }
     
     // Prepare Context
-    // We add a fake "page" number (e.g. 1) since our raw text doesn't have it, 
-    // or we tell LLM to infer/use null.
-    const context = docs.map((d, i) => `[DocID: ${d.doc_id}] Filename: ${d.filename}\nContent: ${d.content.substring(0, 800)}...`).join("\n\n");
+    // Chunks are already short (see CHUNK_SIZE in process_documents.py) and
+    // carry the PDF page they came from.
+    const context = docs.map((d) => `[DocID: ${d.doc_id}] Filename: ${d.filename} Page: ${d.page}\nContent: ${d.content}`).join("\n\n");
 
     const systemPrompt = `
       You are an intelligent assistant for a business ledger system. 
@@ -188,7 +147,7 @@ export async function chatDetail(messages: ChatMessage[]): Promise<ChatResponse>
       1. You MUST cite the source document for every claim.
       2. If you cannot find the answer in the context, output "不明（文書に記載なし）" or "Unknown (not found in documents)".
       3. Return response in JSON format matching the schema.
-      4. If the source text doesn't have explicit page numbers, return null for 'page'.
+      4. Use the Page given for each context entry as the citation 'page'.
       5. IMPORTANT: Respond in the same language as the user's question.
          - If the user asks in Japanese, answer in Japanese.
          - If the user asks in English, answer in English.
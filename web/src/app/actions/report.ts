@@ -125,11 +125,30 @@ export async function generateWeeklyReport(): Promise<ReportData | { error: stri
             LIMIT 20
         `);
 
-        const context = JSON.stringify(ledgerData, null, 2);
+        // Portfolio totals come from the dbt rollups, so the summary covers
+        // every order without pulling detail rows
+        const statusSummary = await query(`
+            SELECT billing_status, SUM(order_count) AS orders, SUM(total_amount) AS total_amount
+            FROM main_gold.gold_rollup_billing_status
+            GROUP BY billing_status
+            ORDER BY billing_status
+        `);
+        const exceptionSummary = await query(`
+            SELECT exception_type, severity, SUM(exception_count) AS exceptions, SUM(total_amount) AS total_amount
+            FROM main_gold.gold_rollup_exceptions
+            GROUP BY exception_type, severity
+            ORDER BY exception_type, severity
+        `);
+
+        const context = JSON.stringify({
+            summary_by_billing_status: statusSummary,
+            exceptions_by_severity: exceptionSummary,
+            attention_orders: ledgerData
+        }, null, 2);
         
         const systemPrompt = `
             You are a financial analyst generating a weekly status report.
-            Analyze the provided ledger data (JSON) and output a structured report.
+            Analyze the provided ledger data (JSON: portfolio summaries plus sample orders needing attention) and output a structured report.
             
             Rules:
             1. 'key_highlights' MUST contain exactly 3 distinct points.
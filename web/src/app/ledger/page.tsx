@@ -1,11 +1,25 @@
-import { getOrders } from "@/lib/data";
+import { Suspense } from "react";
+import { getOrdersPage } from "@/lib/data";
 import { LedgerTable } from "@/components/ledger-table";
 
 // Force dynamic rendering to avoid oversized static page (53MB)
 export const dynamic = 'force-dynamic';
 
-export default async function LedgerPage() {
-  const orders = await getOrders();
+const LEDGER_PAGE_SIZE = 100;
+
+interface LedgerPageProps {
+  searchParams: Promise<{ page?: string; q?: string; status?: string }>;
+}
+
+export default async function LedgerPage({ searchParams }: LedgerPageProps) {
+  const params = await searchParams;
+  const page = Math.max(1, parseInt(params?.page || '1', 10) || 1);
+  const keyword = params?.q || '';
+  const status = params?.status || '';
+
+  // One page from the sharded export (public/data/orders), not the whole
+  // ledger; searches and status filters are applied over all orders
+  const ordersResult = await getOrdersPage(page, LEDGER_PAGE_SIZE, { keyword, status });
 
   return (
     <div className="min-h-screen bg-background">
@@ -18,7 +32,9 @@ export default async function LedgerPage() {
       </header>
 
       <main className="px-6 py-8">
-        <LedgerTable orders={orders} />
+        <Suspense fallback={<div>読み込み中...</div>}>
+          <LedgerTable initialData={ordersResult} keyword={keyword} status={status} />
+        </Suspense>
       </main>
     </div>
   );
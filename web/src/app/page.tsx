@@ -1,19 +1,18 @@
 import { Card, CardContent, CardDescription, CardHeader, CardTitle } from "@/components/ui/card";
 import { Badge } from "@/components/ui/badge";
 import { Separator } from "@/components/ui/separator";
-import { getKPIs, getOrders, getExceptions } from "@/lib/data";
+import { getKPIs, getOrdersPage, getTopExceptions } from "@/lib/data";
 import Link from "next/link";
 
 export default async function DashboardPage() {
-  const kpis = await getKPIs();
-  const exceptions = await getExceptions();
-  // Sort exceptions by severity (CRITICAL > HIGH > MEDIUM > LOW)
-  const severityOrder = { CRITICAL: 0, HIGH: 1, MEDIUM: 2, LOW: 3 };
-  const recentExceptions = [...exceptions]
-    .sort((a, b) => severityOrder[a.severity] - severityOrder[b.severity])
-    .slice(0, 5);
-
-  const recentOrders = (await getOrders()).slice(0, 5);
+  // Only the rows shown are loaded: the count comes from the KPI rollups,
+  // the alerts are the top 5 by severity, the orders the first shard page
+  const [kpis, recentExceptions, recentOrdersPage] = await Promise.all([
+    getKPIs(),
+    getTopExceptions(5),
+    getOrdersPage(1, 5),
+  ]);
+  const recentOrders = recentOrdersPage.data;
 
   const formatCurrency = (amount: number) => {
     return new Intl.NumberFormat('ja-JP', { style: 'currency', currency: 'JPY' }).format(amount);
@@ -80,7 +79,7 @@ export default async function DashboardPage() {
         {/* Exceptions Alert Section */}
         {recentExceptions.length > 0 && (
           <div className="mt-8">
-            <h2 className="text-lg font-semibold mb-4">要対応のアラート ({exceptions.length}件)</h2>
+            <h2 className="text-lg font-semibold mb-4">要対応のアラート ({kpis.exceptionCount}件)</h2>
             <div className="grid gap-4 md:grid-cols-2 lg:grid-cols-3">
               {recentExceptions.map((ex) => (
                 <Card key={ex.order_id} className="border-l-4 border-l-orange-500">
@@ -9,14 +9,14 @@ import {
   TableHeader,
   TableRow,
 } from "@/components/ui/table";
-import { getKPIs, getExceptions } from "@/lib/data";
+import { getKPIs, getTopExceptions } from "@/lib/data";
 import Link from "next/link";
 import { RagChat } from "@/components/rag-chat";
 import { ReportGenerator } from "@/components/report-generator";
 
 export default async function ReportsPage() {
-  const kpis = await getKPIs();
-  const exceptions = await getExceptions();
+  // The action list shows at most 100 rows; the total comes from the KPI rollups
+  const [kpis, sortedExceptions] = await Promise.all([getKPIs(), getTopExceptions(100)]);
 
   const formatCurrency = (amount: number) => {
     return new Intl.NumberFormat('ja-JP', { style: 'currency', currency: 'JPY' }).format(amount);
@@ -35,12 +35,6 @@ export default async function ReportsPage() {
     healthVariant = 'outline';
   }
 
-  // Sort exceptions by urgency
-  const sortedExceptions = [...exceptions].sort((a, b) => {
-    const severityOrder = { CRITICAL: 0, HIGH: 1, MEDIUM: 2, LOW: 3 };
-    return severityOrder[a.severity] - severityOrder[b.severity];
-  });
-
   return (
     <div className="min-h-screen bg-background">
       {/* Page Header */}
@@ -80,7 +74,7 @@ export default async function ReportsPage() {
                 <li>
                   <span className="font-medium">アクション:</span>{' '}
                   <span className="text-orange-600 dark:text-orange-400">
-                    {exceptions.length} 件の対応が必要です
+                    {kpis.exceptionCount} 件の対応が必要です
                   </span>
                 </li>
               </ul>
@@ -96,8 +90,8 @@ export default async function ReportsPage() {
               ) : (
                 <div className="rounded-md border">
                   <div className="p-2 bg-slate-50 border-b text-xs text-muted-foreground text-right">
-                    {sortedExceptions.length > 100 ? (
-                      <span>※パフォーマンスのため、優先度の高い上位100件のみ表示しています（全{sortedExceptions.length}件中）</span>
+                    {kpis.exceptionCount > sortedExceptions.length ? (
+                      <span>※パフォーマンスのため、優先度の高い上位100件のみ表示しています（全{kpis.exceptionCount}件中）</span>
                     ) : (
                       <span>全{sortedExceptions.length}件を表示中</span>
                     )}
@@ -113,7 +107,7 @@ export default async function ReportsPage() {
                       </TableRow>
                     </TableHeader>
                     <TableBody>
-                      {sortedExceptions.slice(0, 100).map((ex) => (
+                      {sortedExceptions.map((ex) => (
                         <TableRow key={ex.order_id}>
                           <TableCell>
                             <Badge variant="outline">{ex.exception_type}</Badge>
@@ -1,6 +1,7 @@
 "use client";
 
-import { useState } from "react";
+import { FormEvent, useState } from "react";
+import { useRouter, useSearchParams } from "next/navigation";
 import {
   Table,
   TableBody,
@@ -18,50 +19,101 @@ import {
   SelectTrigger,
   SelectValue,
 } from "@/components/ui/select";
-import { OrderRow } from "@/lib/data";
+import { OrderRow, PaginatedResult } from "@/lib/data";
 import Link from "next/link";
 import { Card, CardContent, CardDescription, CardHeader, CardTitle } from "@/components/ui/card";
+import {
+  Pagination,
+  PaginationContent,
+  PaginationItem,
+  PaginationLink,
+  PaginationNext,
+  PaginationPrevious,
+} from "@/components/ui/pagination";
+
+interface LedgerTableProps {
+  initialData: PaginatedResult<OrderRow>;
+  keyword: string;
+  status: string;
+}
+
+// Search and status live in the URL (?q=&status=) and are applied on the
+// server over the whole ledger, so totals and pages match the filter.
+export function LedgerTable({ initialData, keyword, status }: LedgerTableProps) {
+  const router = useRouter();
+  const searchParams = useSearchParams();
+  const [searchQuery, setSearchQuery] = useState(keyword);
+  const { data: orders, page, totalPages, total } = initialData;
 
-export function LedgerTable({ orders }: { orders: OrderRow[] }) {
-  const [searchQuery, setSearchQuery] = useState("");
-  const [statusFilter, setStatusFilter] = useState("ALL");
+  const navigate = (updates: Record<string, string>) => {
+    const params = new URLSearchParams(searchParams.toString());
+    for (const [key, value] of Object.entries(updates)) {
+      if (value) {
+        params.set(key, value);
+      } else {
+        params.delete(key);
+      }
+    }
+    router.push(`/ledger?${params.toString()}`);
+  };
+
+  const handlePageChange = (nextPage: number) => {
+    navigate({ page: nextPage.toString() });
+  };
 
-  const filteredOrders = orders.filter((order) => {
-    const matchesSearch =
-      order.organization_name.toLowerCase().includes(searchQuery.toLowerCase()) ||
-      order.procurement_name.toLowerCase().includes(searchQuery.toLowerCase());
-    
-    const matchesStatus =
-      statusFilter === "ALL" || order.billing_status === statusFilter;
+  const handleSearch = (e: FormEvent<HTMLFormElement>) => {
+    e.preventDefault();
+    navigate({ q: searchQuery.trim(), page: '' });
+  };
 
-    return matchesSearch && matchesStatus;
-  });
+  const handleStatusChange = (value: string) => {
+    navigate({ status: value === "ALL" ? '' : value, page: '' });
+  };
 
   const formatCurrency = (amount: number) => {
     return new Intl.NumberFormat('ja-JP', { style: 'currency', currency: 'JPY' }).format(amount);
   };
 
+  // Generate page numbers for pagination display
+  const getVisiblePages = () => {
+    const pages: number[] = [];
+    const maxVisible = 5;
+    let start = Math.max(1, page - Math.floor(maxVisible / 2));
+    let end = Math.min(totalPages, start + maxVisible - 1);
+
+    if (end - start + 1 < maxVisible) {
+      start = Math.max(1, end - maxVisible + 1);
+    }
+
+    for (let i = start; i <= end; i++) {
+      pages.push(i);
+    }
+    return pages;
+  };
+
   return (
     <Card>
       <CardHeader>
         <CardTitle>受注台帳 (Order Ledger)</CardTitle>
         <CardDescription>
-          検索とフィルタリングが可能です ({filteredOrders.length} 件)
+          {keyword || status ? '条件に一致する' : '全'}{total.toLocaleString()}件（{page}ページ目 / {Math.max(totalPages, 1)}ページ）
         </CardDescription>
         <div className="flex gap-4 mt-4">
-          <Input
-            placeholder="発注機関または案件名で検索..."
-            value={searchQuery}
-            onChange={(e) => setSearchQuery(e.target.value)}
-            className="max-w-sm"
-          />
-          <Select value={statusFilter} onValueChange={setStatusFilter}>
+          <form onSubmit={handleSearch} className="max-w-sm flex-1">
+            <Input
+              placeholder="発注機関または案件名で検索（Enter）..."
+              value={searchQuery}
+              onChange={(e) => setSearchQuery(e.target.value)}
+            />
+          </form>
+          <Select value={status || "ALL"} onValueChange={handleStatusChange}>
             <SelectTrigger className="w-[180px]">
               <SelectValue placeholder="Status" />
             </SelectTrigger>
             <SelectContent>
               <SelectItem value="ALL">All Statuses</SelectItem>
               <SelectItem value="UNBILLED">UNBILLED</SelectItem>
+              <SelectItem value="BILLED">BILLED</SelectItem>
               <SelectItem value="OVERDUE">OVERDUE</SelectItem>
               <SelectItem value="PAID">PAID</SelectItem>
               <SelectItem value="INVALID">INVALID</SelectItem>
@@ -84,14 +136,14 @@ export function LedgerTable({ orders }: { orders: OrderRow[] }) {
               </TableRow>
             </TableHeader>
             <TableBody>
-              {filteredOrders.length === 0 ? (
+              {orders.length === 0 ? (
                 <TableRow>
                   <TableCell colSpan={7} className="h-24 text-center">
                     No results found.
                   </TableCell>
                 </TableRow>
               ) : (
-                filteredOrders.map((order) => (
+                orders.map((order) => (
                   <TableRow key={order.sequence_no}>
                     <TableCell className="font-medium">{order.sequence_no}</TableCell>
                     <TableCell>{order.organization_name}</TableCell>
@@ -124,6 +176,43 @@ export function LedgerTable({ orders }: { orders: OrderRow[] }) {
             </TableBody>
           </Table>
         </div>
+
+        {/* Pagination */}
+        {totalPages > 1 && (
+          <div className="mt-4">
+            <Pagination>
+              <PaginationContent>
+                <PaginationItem>
+                  <PaginationPrevious
+                    href="#"
+                    onClick={(e) => { e.preventDefault(); if (page > 1) handlePageChange(page - 1); }}
+                    className={page <= 1 ? "pointer-events-none opacity-50" : "cursor-pointer"}
+                  />
+                </PaginationItem>
+
+                {getVisiblePages().map((pageNum) => (
+                  <PaginationItem key={pageNum}>
+                    <PaginationLink
+                      href="#"
+                      onClick={(e) => { e.preventDefault(); handlePageChange(pageNum); }}
+                      isActive={pageNum === page}
+                    >
+                      {pageNum}
+                    </PaginationLink>
+                  </PaginationItem>
+                ))}
+
+                <PaginationItem>
+                  <PaginationNext
+                    href="#"
+                    onClick={(e) => { e.preventDefault(); if (page < totalPages) handlePageChange(page + 1); }}
+                    className={page >= totalPages ? "pointer-events-none opacity-50" : "cursor-pointer"}
+                  />
+                </PaginationItem>
+              </PaginationContent>
+            </Pagination>
+          </div>
+        )}
       </CardContent>
     </Card>
   );
@@ -3,6 +3,8 @@ import ordersData from './orders.json';
 import exceptionsData from './exceptions.json';
 import invoicesData from './invoices.json';
 import paymentsData from './payments.json';
+import { promises as fs } from 'fs';
+import path from 'path';
 import { query } from './db';
 
 export interface OrderRow {
@@ -76,6 +78,171 @@ export interface PaginatedResult<T> {
   totalPages: number;
 }
 
+// --- Sharded static export (pipelines/export_json.py --mode sharded) ---
+// public/data/<dataset>/index.json describes fixed-size page files, so a
+// page of rows can be served without loading the whole table. Pages are
+// listed in display order; offsets are row positions in that order.
+const SHARD_DIR = path.join(process.cwd(), 'public', 'data');
+
+export type ShardDataset = 'orders' | 'exceptions' | 'invoices' | 'payments';
+
+export interface ShardPage {
+  page: number;
+  file: string;
+  rows: number;
+  offset: number;
+  hash: string;
+  first: Record<string, unknown>;
+  last: Record<string, unknown>;
+}
+
+export interface ShardIndex {
+  table: string;
+  generated_at: string;
+  total_rows: number;
+  page_size: number;
+  total_pages: number;
+  sort: string[];
+  status_column: string | null;
+  status_counts: Record<string, number>;
+  pages: ShardPage[];
+}
+
+// Returns null when the dataset has not been exported in sharded form.
+export async function getShardIndex(dataset: ShardDataset): Promise<ShardIndex | null> {
+  try {
+    const raw = await fs.readFile(path.join(SHARD_DIR, dataset, 'index.json'), 'utf-8');
+    return JSON.parse(raw) as ShardIndex;
+  } catch {
+    return null;
+  }
+}
+
+// Rows [offset, offset + limit) in export order, reading only the shards that overlap them.
+export async function getShardRows<T>(dataset: ShardDataset, offset: number, limit: number): Promise<{ rows: T[]; total: number } | null> {
+  const index = await getShardIndex(dataset);
+  if (!index) {
+    return null;
+  }
+
+  const end = offset + limit;
+  const overlapping = index.pages.filter(p => p.offset < end && p.offset + p.rows > offset);
+  const shards = await Promise.all(overlapping.map(async p => {
+    const raw = await fs.readFile(path.join(SHARD_DIR, dataset, p.file), 'utf-8');
+    return { page: p, rows: JSON.parse(raw) as T[] };
+  }));
+
+  const rows = shards.flatMap(({ page, rows }) =>
+    rows.slice(Math.max(0, offset - page.offset), Math.max(0, end - page.offset))
+  );
+  return { rows, total: index.total_rows };
+}
+
+export async function getShardedPage<T>(dataset: ShardDataset, page: number = 1, pageSize: number = 50): Promise<PaginatedResult<T> | null> {
+  const result = await getShardRows<T>(dataset, (page - 1) * pageSize, pageSize);
+  if (!result) {
+    return null;
+  }
+  return {
+    data: result.rows,
+    total: result.total,
+    page,
+    pageSize,
+    totalPages: Math.ceil(result.total / pageSize)
+  };
+}
+
+export interface OrderFilters {
+  keyword?: string;
+  status?: string;
+}
+
+// Unfiltered pages come straight from the shards. Shards cannot be searched
+// without reading all of them, so filtered pages are queried from
+// gold_ledger in DuckDB (same order as the shards), and only fall back to
+// filtering the full legacy JSON when DuckDB is unavailable.
+export async function getOrdersPage(page: number = 1, pageSize: number = 50, filters: OrderFilters = {}): Promise<PaginatedResult<OrderRow>> {
+  const keyword = filters.keyword?.trim().toLowerCase() || '';
+  const status = filters.status || '';
+  const offset = (page - 1) * pageSize;
+
+  if (!keyword && !status) {
+    const sharded = await getShardedPage<OrderRow>('orders', page, pageSize);
+    if (sharded) {
+      return sharded;
+    }
+  } else {
+    try {
+      const conditions: string[] = [];
+      const params: any[] = [];
+      if (keyword) {
+        conditions.push('(contains(lower(organization_name), ?) OR contains(lower(procurement_name), ?))');
+        params.push(keyword, keyword);
+      }
+      if (status) {
+        conditions.push('billing_status = ?');
+        params.push(status);
+      }
+      const where = `WHERE ${conditions.join(' AND ')}`;
+
+      const countResult = await query(`SELECT COUNT(*) as total FROM main_gold.gold_ledger ${where}`, params);
+      const total = Number(countResult[0]?.total || 0);
+      const data = await query(`
+        SELECT *
+        FROM main_gold.gold_ledger
+        ${where}
+        ORDER BY order_date DESC NULLS LAST, sequence_no DESC
+        LIMIT ? OFFSET ?
+      `, [...params, pageSize, offset]) as OrderRow[];
+
+      return {
+        data,
+        total,
+        page,
+        pageSize,
+        totalPages: Math.ceil(total / pageSize)
+      };
+    } catch (error) {
+      console.error('Error fetching filtered orders:', error);
+    }
+  }
+
+  const allOrders = (await getOrders()).filter((order) =>
+    (!keyword ||
+      order.organization_name?.toLowerCase().includes(keyword) ||
+      order.procurement_name?.toLowerCase().includes(keyword)) &&
+    (!status || order.billing_status === status)
+  );
+  return {
+    data: allOrders.slice(offset, offset + pageSize),
+    total: allOrders.length,
+    page,
+    pageSize,
+    totalPages: Math.ceil(allOrders.length / pageSize)
+  };
+}
+
+// Most severe open exceptions first, for alert lists that show a handful.
+const SEVERITY_RANK: Record<ExceptionRow['severity'], number> = { CRITICAL: 0, HIGH: 1, MEDIUM: 2, LOW: 3 };
+
+export async function getTopExceptions(limit: number = 5): Promise<ExceptionRow[]> {
+  try {
+    return await query(`
+      SELECT *
+      FROM main_gold.gold_exceptions
+      ORDER BY CASE severity WHEN 'CRITICAL' THEN 0 WHEN 'HIGH' THEN 1 WHEN 'MEDIUM' THEN 2 ELSE 3 END,
+        detected_date DESC, order_id, exception_type
+      LIMIT ?
+    `, [limit]) as ExceptionRow[];
+  } catch (error) {
+    console.error('Error fetching top exceptions:', error);
+    const exceptions = await getExceptions();
+    return [...exceptions]
+      .sort((a, b) => SEVERITY_RANK[a.severity] - SEVERITY_RANK[b.severity])
+      .slice(0, limit);
+  }
+}
+
 // --- Legacy JSON-based functions (fallback) ---
 export async function getOrders(): Promise<OrderRow[]> {
   return ordersData as unknown as OrderRow[];
@@ -128,7 +295,11 @@ export async function getInvoicesPaginated(page: number = 1, pageSize: number =
     };
   } catch (error) {
     console.error('Error fetching paginated invoices:', error);
-    // Fallback to JSON with manual pagination
+    // Fallback to the sharded export, then to the legacy JSON with manual pagination
+    const sharded = await getShardedPage<InvoiceRow>('invoices', page, pageSize);
+    if (sharded) {
+      return sharded;
+    }
     const allInvoices = invoicesData as unknown as InvoiceRow[];
     const total = allInvoices.length;
     const data = allInvoices.slice(offset, offset + pageSize);
@@ -174,7 +345,11 @@ export async function getPaymentsPaginated(page: number = 1, pageSize: number =
     };
   } catch (error) {
     console.error('Error fetching paginated payments:', error);
-    // Fallback to JSON with manual pagination
+    // Fallback to the sharded export, then to the legacy JSON with manual pagination
+    const sharded = await getShardedPage<PaymentRow>('payments', page, pageSize);
+    if (sharded) {
+      return sharded;
+    }
     const allPayments = paymentsData as unknown as PaymentRow[];
     const total = allPayments.length;
     const data = allPayments.slice(offset, offset + pageSize);
@@ -189,7 +364,30 @@ export async function getPaymentsPaginated(page: number = 1, pageSize: number =
 }
 
 // --- Other functions ---
+// KPIs are summed from the dbt rollup tables (one row per group, not per
+// order); the JSON exports are only used when DuckDB is unavailable.
 export async function getKPIs(): Promise<KPIs> {
+  try {
+    const [row] = await query(`
+      SELECT
+        (SELECT COALESCE(SUM(order_count), 0) FROM main_gold.gold_rollup_orders_daily) AS total_orders,
+        (SELECT COALESCE(SUM(total_amount), 0) FROM main_gold.gold_rollup_orders_daily) AS total_amount,
+        COALESCE(SUM(total_amount) FILTER (WHERE exception_type = 'UNBILLED'), 0) AS unbilled_amount,
+        COALESCE(SUM(total_amount) FILTER (WHERE exception_type = 'OVERDUE'), 0) AS overdue_amount,
+        COALESCE(SUM(exception_count), 0) AS exception_count
+      FROM main_gold.gold_rollup_exceptions
+    `);
+    return {
+      totalOrders: Number(row.total_orders),
+      totalAmount: Number(row.total_amount),
+      unbilledAmount: Number(row.unbilled_amount),
+      overdueAmount: Number(row.overdue_amount),
+      exceptionCount: Number(row.exception_count)
+    };
+  } catch (error) {
+    console.error('Error fetching KPIs from rollups:', error);
+  }
+
   const orders = await getOrders();
   const exceptions = await getExceptions();
   
@@ -4,21 +4,147 @@ import path from 'path';
 // Architecture Change:
 // Due to Node.js v23 native module incompatibility with DuckDB,
 // we proxy queries through a Python script using the project's venv.
+//
+// If the persistent query server is running (`pnpm query-server`), queries go
+// over localhost HTTP to a warm connection pool. Otherwise we fall back to
+// spawning a one-shot Python process per query.
 
 const PYTHON_SCRIPT_PATH = path.join(process.cwd(), 'src', 'lib', 'query_duckdb.py');
 // Assuming .venv is in the project root (one level up from web/)
 const PYTHON_BIN_PATH = path.join(process.cwd(), '..', '.venv', 'bin', 'python');
 
+const QUERY_SERVER_URL = process.env.QUERY_SERVER_URL || 'http://127.0.0.1:8765';
+
+// Response shapes of query_duckdb.py, selected by the "format" payload field.
+export type QueryFormat = 'rows' | 'columns';
+
+export interface ColumnarResult {
+  columns: string[];
+  data: Record<string, any[]>;
+}
+
 export async function query(sql: string, params: any[] = []): Promise<any[]> {
+  const result = await run(sql, params, 'rows');
+  return result.data || [];
+}
+
+// Column-oriented variant for large pulls: one array per column instead of
+// one object per row, which is much cheaper to build and parse.
+export async function queryColumns(sql: string, params: any[] = []): Promise<ColumnarResult> {
+  const result = await run(sql, params, 'columns');
+  return { columns: result.columns || [], data: result.data || {} };
+}
+
+export interface SearchHit {
+  doc_id: string;
+  filename: string;
+  page: number;
+  content: string;
+  score: number;
+}
+
+// Ranked (BM25) retrieval over document chunks via the pipeline-built
+// inverted index; see search_documents() in query_duckdb.py.
+export async function searchDocuments(text: string, limit: number = 5): Promise<SearchHit[]> {
+  const result = await send(JSON.stringify({ search: text, limit }));
+  return result.data || [];
+}
+
+// Streaming variant: yields row batches as DuckDB produces them, so large
+// results can be rendered progressively with bounded memory on both sides.
+export async function* queryStream(sql: string, params: any[] = [], batchSize: number = 1000): AsyncGenerator<any[]> {
+  const payload = JSON.stringify({ sql, params, format: 'ndjson', batch_size: batchSize });
+
+  for await (const line of streamLines(payload)) {
+    if (!line.trim()) {
+      continue;
+    }
+    const message = JSON.parse(line);
+    if (message.error) {
+      throw new Error(message.error);
+    }
+    if (message.data) {
+      yield message.data;
+    }
+  }
+}
+
+async function run(sql: string, params: any[], format: QueryFormat): Promise<any> {
+  return send(JSON.stringify({ sql, params, format }));
+}
+
+async function send(payload: string): Promise<any> {
+  const served = await queryServer(payload);
+  if (served !== null) {
+    return served;
+  }
+  return querySubprocess(payload);
+}
+
+// Returns null when the server is not reachable so the caller can fall back.
+async function postToServer(payload: string): Promise<Response | null> {
+  try {
+    return await fetch(`${QUERY_SERVER_URL}/query`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: payload,
+    });
+  } catch {
+    return null;
+  }
+}
+
+async function queryServer(payload: string): Promise<any | null> {
+  const response = await postToServer(payload);
+  if (response === null) {
+    return null;
+  }
+
+  const result = await response.json();
+  if (result.error) {
+    throw new Error(result.error);
+  }
+  return result;
+}
+
+async function* streamLines(payload: string): AsyncGenerator<string> {
+  let chunks: AsyncIterable<Uint8Array>;
+
+  const response = await postToServer(payload);
+  if (response?.body) {
+    chunks = response.body as unknown as AsyncIterable<Uint8Array>;
+  } else {
+    const python = spawn(PYTHON_BIN_PATH, [PYTHON_SCRIPT_PATH]);
+    python.stdin.write(payload);
+    python.stdin.end();
+    chunks = python.stdout;
+  }
+
+  const decoder = new TextDecoder();
+  let buffer = '';
+  for await (const chunk of chunks) {
+    buffer += decoder.decode(chunk, { stream: true });
+    let newline;
+    while ((newline = buffer.indexOf('\n')) >= 0) {
+      yield buffer.slice(0, newline);
+      buffer = buffer.slice(newline + 1);
+    }
+  }
+  buffer += decoder.decode();
+  if (buffer) {
+    yield buffer;
+  }
+}
+
+function querySubprocess(payload: string): Promise<any> {
   return new Promise((resolve, reject) => {
     // Spawn python process using venv interpreter
     const python = spawn(PYTHON_BIN_PATH, [PYTHON_SCRIPT_PATH]);
-    
+
     let stdoutData = '';
     let stderrData = '';
 
     // Send payload to stdin
-    const payload = JSON.stringify({ sql, params });
     python.stdin.write(payload);
     python.stdin.end();
 
@@ -40,21 +166,21 @@ export async function query(sql: string, params: any[] = []): Promise<any[]> {
       try {
         if (!stdoutData.trim()) {
            // No output? Should assume empty or error if not caught above
-           return resolve([]);
+           return resolve({});
         }
-        
+
         const result = JSON.parse(stdoutData);
-        
+
         if (result.error) {
           return reject(new Error(result.error));
         }
-        
-        resolve(result.data || []);
+
+        resolve(result);
       } catch (e) {
         reject(new Error(`Failed to parse Python output: ${e}, Raw: ${stdoutData}, Stderr: ${stderrData}`));
       }
     });
-    
+
     python.on('error', (err) => {
         reject(new Error(`Failed to spawn python process: ${err.message}`));
     });
@@ -2,10 +2,17 @@ import duckdb
 import sys
 import json
 import os
+import argparse
+import re
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
 # Adjust DB_PATH to be relative to where the script is located or cwd?
 # In db.ts, we used path.join(process.cwd(), '..', 'warehouse.duckdb').
-# Assuming this script is run from project root or similar. 
+# Assuming this script is run from project root or similar.
 # Let's use an absolute path logic based on this script's location.
 # Script is in web/src/lib/query_duckdb.py
 # Warehouse is in warehouse.duckdb (project root)
@@ -13,6 +20,292 @@ import os
 BASE_DIR = os.path.dirname(os.path.abspath(__file__)) # web/src/lib
 PROJECT_ROOT = os.path.abspath(os.path.join(BASE_DIR, '..', '..', '..')) # project root
 DB_PATH = os.path.join(PROJECT_ROOT, 'warehouse.duckdb')
+# Sidecar written by pipelines/update_warehouse.py with the current load generation id
+GENERATION_SUFFIX = '.generation'
+# Parquet artifacts written by `pipelines/export_json.py --mode parquet`, one
+# <table>.parquet per main_gold table. When warehouse.duckdb is not deployed,
+# queries run against an in-memory DuckDB with main_gold views over them.
+ARTIFACT_DIR = os.environ.get("WAREHOUSE_ARTIFACT_DIR", os.path.join(PROJECT_ROOT, 'web', 'data', 'parquet'))
+ARTIFACT_SCHEMA = "main_gold"
+# pipelines/search_index.py provides the tokenizer shared with the index build
+PIPELINES_DIR = os.path.join(PROJECT_ROOT, 'pipelines')
+
+# Query server (--serve) defaults. db.ts talks to the same host/port.
+SERVER_HOST = os.environ.get("QUERY_SERVER_HOST", "127.0.0.1")
+SERVER_PORT = int(os.environ.get("QUERY_SERVER_PORT", "8765"))
+POOL_SIZE = int(os.environ.get("QUERY_SERVER_POOL_SIZE", "4"))
+# The pool closes the database after this many idle seconds, so the refresh
+# pipeline (update_warehouse.py, dbt) can take its write lock.
+POOL_IDLE_SECONDS = float(os.environ.get("QUERY_SERVER_IDLE_SECONDS", "5"))
+
+# Response formats negotiated via payload["format"]:
+#   rows    - {"data": [{col: val, ...}, ...]} (default, one dict per row)
+#   columns - {"columns": [...], "data": {col: [val, ...]}} built from Arrow batches
+#   arrow   - Arrow IPC stream (binary), batches written as DuckDB produces them
+#   ndjson  - one {"data": [rows]} line per batch of payload["batch_size"] rows,
+#             terminated by {"done": true, "rows": N} (or an {"error"} line)
+FORMATS = ("rows", "columns", "arrow", "ndjson")
+ARROW_BATCH_SIZE = 65536
+NDJSON_BATCH_SIZE = 1000
+ARROW_CONTENT_TYPE = "application/vnd.apache.arrow.stream"
+NDJSON_CONTENT_TYPE = "application/x-ndjson"
+
+# Result cache for the query server. Entries are keyed on the warehouse
+# generation, so a refresh invalidates everything without explicit flushing.
+CACHE_MAX_ENTRIES = int(os.environ.get("QUERY_CACHE_MAX_ENTRIES", "256"))
+CACHE_TTL_SECONDS = float(os.environ.get("QUERY_CACHE_TTL", "3600"))
+
+# Whitespace runs outside single-quoted literals
+_SQL_WHITESPACE = re.compile(r"('(?:[^']|'')*')|\s+")
+
+
+def normalize_sql(sql):
+    """Collapse insignificant whitespace so formatting differences share a cache entry."""
+    return _SQL_WHITESPACE.sub(lambda m: m.group(1) or " ", sql).strip()
+
+
+# BM25 ranking over main_gold.gold_document_terms (built by the pipeline).
+# Parameters: query terms, result limit.
+BM25_K1 = 1.2
+BM25_B = 0.75
+SEARCH_SQL = f"""
+    WITH q AS (
+        SELECT DISTINCT unnest(?::VARCHAR[]) AS term
+    ),
+    stats AS (
+        SELECT count(*) AS n, avg(token_count) AS avgdl
+        FROM main_gold.gold_document_chunks
+    ),
+    matches AS (
+        SELECT t.term, t.chunk_id, t.tf, count(*) OVER (PARTITION BY t.term) AS df
+        FROM main_gold.gold_document_terms t
+        JOIN q ON t.term = q.term
+    ),
+    scored AS (
+        SELECT
+            m.chunk_id,
+            sum(
+                ln(1 + (s.n - m.df + 0.5) / (m.df + 0.5))
+                * m.tf * ({BM25_K1} + 1)
+                / (m.tf + {BM25_K1} * (1 - {BM25_B} + {BM25_B} * c.token_count / s.avgdl))
+            ) AS score
+        FROM matches m
+        JOIN main_gold.gold_document_chunks c ON m.chunk_id = c.chunk_id
+        CROSS JOIN stats s
+        GROUP BY m.chunk_id
+    )
+    SELECT c.doc_id, c.filename, c.page, c.text AS content, sc.score
+    FROM scored sc
+    JOIN main_gold.gold_document_chunks c ON sc.chunk_id = c.chunk_id
+    ORDER BY sc.score DESC, c.chunk_id
+    LIMIT ?
+"""
+SEARCH_LIMIT = 5
+
+
+def load_generation_id(db_path=DB_PATH):
+    """Generation id published by pipelines/update_warehouse.py, or None."""
+    try:
+        with open(db_path + GENERATION_SUFFIX, encoding="utf-8") as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+
+def artifact_files(artifact_dir=ARTIFACT_DIR):
+    try:
+        names = sorted(name for name in os.listdir(artifact_dir) if name.endswith(".parquet"))
+    except OSError:
+        return []
+    return [os.path.join(artifact_dir, name) for name in names]
+
+
+def warehouse_generation(db_path=DB_PATH):
+    """
+    Stamp that changes whenever the warehouse changes: the load generation id
+    plus the file's mtime/size (dbt rewrites the file without a new load).
+    Without a database file, the Parquet artifacts' mtimes/sizes stand in.
+    """
+    try:
+        stat = os.stat(db_path)
+    except OSError:
+        stats = [os.stat(path) for path in artifact_files()]
+        if not stats:
+            return None
+        return "parquet:" + ",".join(f"{st.st_mtime_ns}-{st.st_size}" for st in stats)
+    return f"{load_generation_id(db_path) or '-'}:{stat.st_mtime_ns}-{stat.st_size}"
+
+
+def connect_warehouse(db_path=DB_PATH):
+    """
+    Open the warehouse read-only. If the database file is absent but Parquet
+    artifacts are, return an in-memory database exposing each file as a
+    main_gold view instead; DuckDB reads only the columns and row groups
+    (by their min/max statistics) a query needs.
+    """
+    paths = [] if os.path.exists(db_path) else artifact_files()
+    if not paths:
+        # read_only=True is much safer for concurrent access
+        return duckdb.connect(db_path, read_only=True)
+
+    con = duckdb.connect()
+    con.execute(f"CREATE SCHEMA {ARTIFACT_SCHEMA}")
+    for path in paths:
+        table = os.path.splitext(os.path.basename(path))[0]
+        literal = path.replace("'", "''")
+        con.execute(f"CREATE VIEW {ARTIFACT_SCHEMA}.{table} AS SELECT * FROM read_parquet('{literal}')")
+    return con
+
+
+def execute_query(con, sql, params):
+    """
+    Run a single statement and return the rows as a list of dicts.
+    Values go through the same Arrow conversion as the columns/ndjson
+    formats (_json_ready), so every format renders them identically.
+    """
+    table = record_batch_reader(con, sql, params).read_all()
+    return _json_ready_table(table).to_pylist()
+
+
+def record_batch_reader(con, sql, params, batch_size=ARROW_BATCH_SIZE):
+    """Execute and return a pyarrow RecordBatchReader over the result."""
+    rel = con.execute(sql, params)
+    # to_arrow_reader() replaces fetch_record_batch() in newer DuckDB releases
+    if hasattr(rel, "to_arrow_reader"):
+        return rel.to_arrow_reader(batch_size)
+    return rel.fetch_record_batch(batch_size)
+
+
+# Temporal values in every response format: ISO 8601 with a "T" separator,
+# and time zone aware timestamps converted to UTC with a "+00:00" offset.
+ISO_DATE_FORMAT = "%Y-%m-%d"
+ISO_TIME_FORMAT = "%H:%M:%S"
+ISO_TIMESTAMP_FORMAT = f"{ISO_DATE_FORMAT}T{ISO_TIME_FORMAT}"
+
+
+def _json_ready(column):
+    """Cast an Arrow column to types json.dumps handles, without per-cell Python calls."""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    if pa.types.is_timestamp(column.type):
+        if column.type.tz is not None:
+            utc = column.cast(pa.timestamp(column.type.unit, "UTC"))
+            return pc.strftime(utc, ISO_TIMESTAMP_FORMAT + "+00:00")
+        return pc.strftime(column, ISO_TIMESTAMP_FORMAT)
+    if pa.types.is_date(column.type):
+        return pc.strftime(column, ISO_DATE_FORMAT)
+    if pa.types.is_time(column.type):
+        return pc.strftime(column, ISO_TIME_FORMAT)
+    if pa.types.is_temporal(column.type):
+        return column.cast(pa.string())
+    if pa.types.is_decimal(column.type):
+        return column.cast(pa.float64())
+    return column
+
+
+def _json_ready_table(table):
+    """Apply _json_ready to every column of an Arrow table."""
+    import pyarrow as pa
+
+    return pa.Table.from_arrays([_json_ready(column) for column in table.columns], names=table.column_names)
+
+
+def execute_columns(con, sql, params):
+    """Run a statement and return the result column-wise, converting each whole column at once."""
+    table = _json_ready_table(record_batch_reader(con, sql, params).read_all())
+    return {"columns": table.column_names, "data": {col: table.column(col).to_pylist() for col in table.column_names}}
+
+
+def write_arrow_stream(reader, sink):
+    """Write every batch of a RecordBatchReader to sink as an Arrow IPC stream."""
+    import pyarrow as pa
+
+    with pa.ipc.new_stream(sink, reader.schema) as writer:
+        for batch in reader:
+            writer.write_batch(batch)
+
+
+def write_ndjson_stream(reader, sink):
+    """
+    Write one JSON line per record batch to sink, flushing after each so the
+    reader can start consuming before the query has finished.
+    """
+    import pyarrow as pa
+
+    total = 0
+    try:
+        for batch in reader:
+            batch = pa.RecordBatch.from_arrays(
+                [_json_ready(column) for column in batch.columns],
+                names=batch.schema.names,
+            )
+            sink.write((json.dumps({"data": batch.to_pylist()}) + "\n").encode("utf-8"))
+            sink.flush()
+            total += batch.num_rows
+    except Exception as e:
+        # Lines are self-delimiting, so a late failure can still be reported
+        sink.write((json.dumps({"error": str(e)}) + "\n").encode("utf-8"))
+        return
+    sink.write((json.dumps({"done": True, "rows": total}) + "\n").encode("utf-8"))
+
+
+class StreamResponse:
+    """A response body that is written incrementally instead of built in memory."""
+
+    def __init__(self, content_type, reader, write):
+        self.content_type = content_type
+        self.reader = reader
+        self._write = write
+
+    def write_to(self, sink):
+        self._write(self.reader, sink)
+
+
+def search_documents(con, text, limit=SEARCH_LIMIT):
+    """Return the document chunks best matching free text, ranked by BM25."""
+    if PIPELINES_DIR not in sys.path:
+        sys.path.append(PIPELINES_DIR)
+    from search_index import tokenize
+
+    terms = tokenize(text)
+    if not terms:
+        return []
+    return execute_query(con, SEARCH_SQL, [terms, limit])
+
+
+def handle_payload(con, payload):
+    """
+    Apply the {"sql", "params", "format"} contract, or {"search", "limit"}
+    for ranked document retrieval.
+    Returns a dict for JSON responses ({"data"} / {"error"}), or a
+    StreamResponse for the arrow/ndjson formats that the caller writes out.
+    """
+    if "search" in payload:
+        return {"data": search_documents(con, payload["search"], int(payload.get("limit", SEARCH_LIMIT)))}
+
+    sql = payload.get("sql")
+    params = payload.get("params", [])
+    fmt = payload.get("format", "rows")
+
+    if not sql:
+        return {"error": "No SQL provided"}
+    if fmt not in FORMATS:
+        return {"error": f"Unknown format: {fmt}"}
+
+    if fmt == "arrow":
+        reader = record_batch_reader(con, sql, params)
+        return StreamResponse(ARROW_CONTENT_TYPE, reader, write_arrow_stream)
+    if fmt == "ndjson":
+        batch_size = int(payload.get("batch_size", NDJSON_BATCH_SIZE))
+        if batch_size <= 0:
+            return {"error": "batch_size must be positive"}
+        reader = record_batch_reader(con, sql, params, batch_size)
+        return StreamResponse(NDJSON_CONTENT_TYPE, reader, write_ndjson_stream)
+    if fmt == "columns":
+        return execute_columns(con, sql, params)
+    return {"data": execute_query(con, sql, params)}
+
 
 def run_query():
     try:
@@ -23,52 +316,281 @@ def run_query():
             return
 
         payload = json.loads(input_data)
-        sql = payload.get("sql")
-        params = payload.get("params", [])
 
-        if not sql:
-            print(json.dumps({"error": "No SQL provided"}))
-            return
+        # Connect to DuckDB (or the Parquet artifacts when it is not deployed)
+        con = connect_warehouse()
+        try:
+            response = handle_payload(con, payload)
+            if isinstance(response, StreamResponse):
+                response.write_to(sys.stdout.buffer)
+                sys.stdout.buffer.flush()
+                return
+        finally:
+            con.close()
 
-        # Connect to DuckDB
-        # read_only=True is much safer for concurrent access
-        con = duckdb.connect(DB_PATH, read_only=True)
-        
-        # Execute
-        # DuckDB python execute syntax: con.execute(sql, parameters)
-        # Results can be fetched as list of tuples using fetchall()
-        # But we want objects/dicts for JSON.
-        # df() returns a pandas dataframe
-        # fetch_df() is also available.
-        # Let's inspect column names first or use fetchall and map.
-        
-        rel = con.execute(sql, params)
-        
-        # Get column names
-        columns = [desc[0] for desc in rel.description]
-        
-        rows = rel.fetchall()
-        
-        results = []
-        for row in rows:
-            record = {}
-            for i, col in enumerate(columns):
-                # Handle types that might not serialize well to JSON
-                # e.g. dates, though JSON serializer can custom handle them
-                val = row[i]
-                # Simple datetime string conversion
-                if hasattr(val, 'isoformat'):
-                    val = val.isoformat()
-                record[col] = val
-            results.append(record)
-            
-        con.close()
-        
-        print(json.dumps({"data": results}))
+        print(json.dumps(response))
 
     except Exception as e:
         # Print error in JSON format so caller can parse it
         print(json.dumps({"error": str(e)}))
 
+
+class ConnectionPool:
+    """
+    Fixed-size pool of read-only DuckDB connections.
+    All connections are cursors on one database instance, opened on first
+    use, so a burst of requests only pays for its own queries. DuckDB holds a
+    file lock while the database is open, which blocks every writer; the
+    instance is therefore closed again once no query has run for
+    idle_seconds and reopened by the next request. It is also reopened when
+    warehouse_generation() changes, so queries never run against a file the
+    pipeline has since rewritten.
+    """
+
+    def __init__(self, db_path, size, idle_seconds=POOL_IDLE_SECONDS):
+        self.db_path = db_path
+        self.size = size
+        self.idle_seconds = idle_seconds
+        self._cond = threading.Condition()
+        self._db = None
+        self._generation = None
+        self._idle = []
+        self._in_use = 0
+        self._last_used = time.monotonic()
+        threading.Thread(target=self._close_when_idle, daemon=True).start()
+
+    def _open(self, generation):
+        self._generation = generation
+        self._db = connect_warehouse(self.db_path)
+        self._idle = [self._db.cursor() for _ in range(self.size)]
+
+    def _close(self):
+        for con in self._idle:
+            con.close()
+        self._idle = []
+        self._db.close()
+        self._db = None
+
+    @contextmanager
+    def connection(self):
+        """
+        Borrow a cursor as (cursor, generation): the warehouse generation the
+        database was opened at, which is what results should be cached under.
+        A changed generation closes the database once in-flight queries have
+        finished and reopens it.
+        """
+        with self._cond:
+            while True:
+                generation = warehouse_generation(self.db_path)
+                if self._db is not None and generation != self._generation:
+                    if self._in_use:
+                        self._cond.wait()
+                        continue
+                    self._close()
+                if self._db is None:
+                    self._open(generation)
+                if self._idle:
+                    break
+                self._cond.wait()
+            con = self._idle.pop()
+            self._in_use += 1
+        try:
+            yield con, generation
+        finally:
+            with self._cond:
+                self._idle.append(con)
+                self._in_use -= 1
+                self._last_used = time.monotonic()
+                self._cond.notify_all()
+
+    def _close_when_idle(self):
+        while True:
+            time.sleep(max(self.idle_seconds / 2, 0.1))
+            with self._cond:
+                idle_for = time.monotonic() - self._last_used
+                if self._db is not None and self._in_use == 0 and idle_for >= self.idle_seconds:
+                    self._close()
+
+    def close(self):
+        with self._cond:
+            while self._in_use:
+                self._cond.wait()
+            if self._db is not None:
+                self._close()
+
+
+class ResultCache:
+    """Thread-safe LRU cache of serialized responses with size and TTL eviction."""
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(payload, generation):
+        request = {k: v for k, v in payload.items() if k != "cache"}
+        request["sql"] = normalize_sql(payload.get("sql") or "")
+        return json.dumps(request, sort_keys=True, default=str), generation
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            stored_at, value = entry
+            if time.monotonic() - stored_at > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class ChunkedWriter:
+    """File-like wrapper that writes HTTP/1.1 chunked transfer encoding."""
+
+    closed = False
+
+    def __init__(self, wfile):
+        self._wfile = wfile
+
+    def write(self, data):
+        if data:
+            self._wfile.write(f"{len(data):X}\r\n".encode("ascii"))
+            self._wfile.write(data)
+            self._wfile.write(b"\r\n")
+        return len(data)
+
+    def flush(self):
+        self._wfile.flush()
+
+    def close(self):
+        if not self.closed:
+            self._wfile.write(b"0\r\n\r\n")
+            self._wfile.flush()
+            self.closed = True
+
+
+class QueryHandler(BaseHTTPRequestHandler):
+    """POST /query with the same JSON payload run_query() reads from stdin."""
+
+    protocol_version = "HTTP/1.1"
+    pool = None
+    cache = None
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send_json({"status": "ok", "generation": load_generation_id()})
+        else:
+            self._send_json({"error": "Not found"}, status=404)
+
+    def do_POST(self):
+        if self.path != "/query":
+            self._send_json({"error": "Not found"}, status=404)
+            return
+
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            payload = json.loads(self.rfile.read(length) or b"{}")
+
+            # Streamed formats are never cached; neither are requests
+            # that opt out with "cache": false.
+            cacheable = payload.get("cache", True) and payload.get("format", "rows") in ("rows", "columns")
+            cache_key = None
+            if cacheable:
+                body = self.cache.get(self.cache.key(payload, warehouse_generation()))
+                if body is not None:
+                    self._send_body(body)
+                    return
+
+            # The pool reopens the database if its generation changed; the
+            # result is cached under the generation it was actually read from.
+            with self.pool.connection() as (con, generation):
+                response = handle_payload(con, payload)
+                if isinstance(response, StreamResponse):
+                    self._send_stream(response)
+                    return
+            if cacheable:
+                cache_key = self.cache.key(payload, generation)
+        except Exception as e:
+            response = {"error": str(e)}
+            cache_key = None
+
+        body = json.dumps(response).encode("utf-8")
+        if cache_key is not None and "error" not in response:
+            self.cache.put(cache_key, body)
+        self._send_body(body)
+
+    def _send_stream(self, response):
+        self.send_response(200)
+        self.send_header("Content-Type", response.content_type)
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        out = ChunkedWriter(self.wfile)
+        try:
+            response.write_to(out)
+        except Exception:
+            # Headers are already sent; drop the connection so the client
+            # sees a truncated stream instead of a bogus JSON error body.
+            self.close_connection = True
+            return
+        out.close()
+
+    def _send_json(self, response, status=200):
+        self._send_body(json.dumps(response).encode("utf-8"), status)
+
+    def _send_body(self, body, status=200):
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Per-request access logs are noise for a local sidecar
+        pass
+
+
+def serve(host=SERVER_HOST, port=SERVER_PORT, pool_size=POOL_SIZE,
+          cache_size=CACHE_MAX_ENTRIES, cache_ttl=CACHE_TTL_SECONDS, idle_seconds=POOL_IDLE_SECONDS):
+    """Run a long-lived local query server backed by a warm connection pool."""
+    QueryHandler.pool = ConnectionPool(DB_PATH, pool_size, idle_seconds)
+    QueryHandler.cache = ResultCache(cache_size, cache_ttl)
+    server = ThreadingHTTPServer((host, port), QueryHandler)
+    source = DB_PATH if os.path.exists(DB_PATH) else ARTIFACT_DIR
+    print(f"Serving {source} on http://{host}:{port} (pool size {pool_size})", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        QueryHandler.pool.close()
+
+
 if __name__ == "__main__":
-    run_query()
+    parser = argparse.ArgumentParser(description="Run SQL against warehouse.duckdb")
+    parser.add_argument("--serve", action="store_true", help="Run as a persistent local query server")
+    parser.add_argument("--host", default=SERVER_HOST, help="Server bind address")
+    parser.add_argument("--port", type=int, default=SERVER_PORT, help="Server port")
+    parser.add_argument("--pool-size", type=int, default=POOL_SIZE, help="Number of pooled connections")
+    parser.add_argument("--idle-seconds", type=float, default=POOL_IDLE_SECONDS,
+                        help="Close the database after this many idle seconds so writers can lock it")
+    parser.add_argument("--cache-size", type=int, default=CACHE_MAX_ENTRIES, help="Max cached results (0 disables)")
+    parser.add_argument("--cache-ttl", type=float, default=CACHE_TTL_SECONDS, help="Cached result lifetime in seconds")
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.host, args.port, args.pool_size, args.cache_size, args.cache_ttl, args.idle_seconds)
+    else:
+        run_query()